@@ -0,0 +1,48 @@
+"""Аутентификация по токену с кэшированием.
+
+Токен вместе с пользователем хранится в отдельном кэше
+(`TOKEN_CACHE_ALIAS`), общем для всех процессов и ограниченном
+по времени жизни,
+поэтому на авторизованный запрос не тратится ни одного запроса к базе.
+Запись сбрасывается при удалении токена (logout), сохранении
+пользователя (смена пароля, деактивация) - см. `api.signals`.
+"""
+from hashlib import sha256
+
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from api.manager.conf import TOKEN_CACHE_ALIAS, TOKEN_CACHE_PREFIX
+
+
+def token_cache_key(key):
+    """Ключ кэша для токена. Сам токен в ключ не попадает."""
+    return f'{TOKEN_CACHE_PREFIX}:{sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_tokens(*keys):
+    """Удаляет токены из кэша.
+
+    Args:
+        keys (str): Ключи токенов.
+    """
+    caches[TOKEN_CACHE_ALIAS].delete_many(
+        [token_cache_key(key) for key in keys]
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """`TokenAuthentication`, который читает токен из кэша.
+
+    В кэш попадают только действительные токены активных
+    пользователей, ошибки аутентификации не кэшируются.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token)
+        return token.user, token
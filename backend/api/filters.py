@@ -1,34 +1,155 @@
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import (Case, CharField, Exists, IntegerField, OuterRef,
+                              TextField, Value, When)
+from django_filters.fields import MultipleChoiceField
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from api.lookups import ILikeContains, ILikeStartsWith
+from api.manager.ingredient_index import ingredient_index
+from api.manager.tag_map import tag_choices, tag_slug_map
+from api.validators import incorrect_layout
+from recipes.models import AmountIngredient, Recipe
+
+CharField.register_lookup(ILikeContains)
+CharField.register_lookup(ILikeStartsWith)
+TextField.register_lookup(ILikeContains)
+TextField.register_lookup(ILikeStartsWith)
+
+
+class TagSlugField(MultipleChoiceField):
+    """Список слагов тегов.
+
+    Перед проверкой по `choices` словарь тегов перечитывается,
+    если в нём нет какого-то из слагов (см. `tag_slug_map`).
+    """
+
+    def validate(self, value):
+        if value:
+            tag_slug_map(value)
+        super().validate(value)
+
+
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    field_class = TagSlugField
 
 
 class RecipeAndCartFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
-                                             to_field_name='slug',
-                                             queryset=Tag.objects.all())
+    tags = TagSlugFilter(
+        choices=tag_choices,
+        method='tags_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
+    search = filters.CharFilter(
+        method='search_filter')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
+    def tags_filter(self, queryset, name, value):
+        """Оставляет рецепты, у которых есть хотя бы один из тегов.
+
+        Слаги переводятся в id по словарю из кэша, а проверка идёт
+        подзапросом `EXISTS`: без JOIN рецепт с несколькими тегами
+        не дублируется и `DISTINCT` не нужен.
+
+        Returns:
+            QuerySet: Отфильтрованные рецепты.
+        """
+        if not value:
+            return queryset
+
+        slug_map = tag_slug_map(value)
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[slug_map[slug] for slug in value],
+        )))
+
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shoppingcart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
+    def search_filter(self, queryset, name, value):
+        """Ищет рецепты по названию, описанию и ингредиентам.
+
+        Каждое условие выбирает id рецептов отдельным подзапросом,
+        подзапросы объединяются `UNION`. На PostgreSQL каждый из них
+        обслуживается своим GIN-индексом `gin_trgm_ops` (`ILIKE`,
+        см. `api.lookups`), дополнительно находятся названия
+        с опечатками (`%>`). На SQLite (режим `REVIEW`) выполняется
+        `LIKE` по строкам в нижнем регистре, в том числе для кириллицы.
+        Сначала идут совпадения по началу названия, затем по названию,
+        ингредиентам и описанию.
+
+        Returns:
+            QuerySet: Найденные рецепты, упорядоченные по релевантности.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+
+        recipes = Recipe.objects.order_by().values('pk')
+        in_ingredients = AmountIngredient.objects.filter(
+            ingredients__name__ilike=value
+        ).order_by().values('recipe_id')
+        found = [
+            recipes.filter(name__ilike=value),
+            recipes.filter(text__ilike=value),
+            in_ingredients,
+        ]
+        ordering = ['-search_rank']
+
+        if connections[queryset.db].vendor == 'postgresql':
+            found.append(recipes.filter(name__trigram_word_similar=value))
+            queryset = queryset.annotate(
+                search_similarity=TrigramWordSimilarity(value, 'name')
+            )
+            ordering.append('-search_similarity')
+
+        return queryset.filter(
+            pk__in=found[0].union(*found[1:])
+        ).annotate(
+            search_rank=Case(
+                When(name__ilike_startswith=value, then=Value(3)),
+                When(name__ilike=value, then=Value(2)),
+                When(pk__in=in_ingredients, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by(*ordering, '-pub_date')
+
 
 class IngredientSearchFilter(SearchFilter):
+    """
+    Поиск ингредиентов по названию для автодополнения.
+    Список ингредиентов берётся из индекса в памяти процесса:
+    сначала совпадения по началу названия, затем по его части.
+    При `layout_tolerant` также ищется строка, набранная в латинской
+    раскладке вместо русской ("vjkjrj" -> "молоко").
+    """
     search_param = 'name'
+    layout_tolerant = True
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+
+        if not term or getattr(view, 'action', None) != 'list':
+            return super().filter_queryset(request, queryset, view)
+
+        if self.layout_tolerant:
+            return ingredient_index.search(
+                term, term.lower().translate(incorrect_layout)
+            )
+        return ingredient_index.search(term)
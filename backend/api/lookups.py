@@ -0,0 +1,64 @@
+from django.db.backends.signals import connection_created
+from django.db.models.lookups import IContains, IStartsWith
+from django.dispatch import receiver
+
+# Функция SQLite, переводящая строку в нижний регистр с учётом Unicode:
+# встроенные `LOWER()` и `LIKE` учитывают регистр только латиницы
+SQLITE_UNICODE_LOWER = 'unicode_lower'
+
+
+def unicode_lower(value):
+    return None if value is None else str(value).lower()
+
+
+@receiver(connection_created)
+def register_unicode_lower(connection, **kwargs):
+    """Регистрирует `unicode_lower` в каждом новом соединении SQLite."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            SQLITE_UNICODE_LOWER, 1, unicode_lower, deterministic=True
+        )
+
+
+class ILikeMixin:
+    """Сравнение без учёта регистра через `ILIKE` на PostgreSQL.
+
+    Django строит `icontains`/`istartswith` на PostgreSQL как
+    `UPPER(field::text) LIKE UPPER(%s)`, индекс `gin_trgm_ops` по самому
+    полю такое выражение не обслуживает. Здесь поле сравнивается
+    напрямую (`field ILIKE %s`), и индекс используется.
+    На SQLite обе стороны приводятся к нижнему регистру с учётом Unicode
+    (`unicode_lower`), иначе "суп" не находит "Суп".
+    На остальных базах работает как встроенный поиск Django.
+    """
+
+    def get_rhs_op(self, connection, rhs):
+        if connection.vendor == 'postgresql':
+            return f'ILIKE {rhs}'
+        return connection.operators[self.builtin_lookup] % rhs
+
+    def as_sqlite(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(
+            param.lower() if isinstance(param, str) else param
+            for param in rhs_params
+        )
+        return (
+            f'{SQLITE_UNICODE_LOWER}({lhs_sql}) '
+            f'{self.get_rhs_op(connection, rhs_sql)}',
+            params,
+        )
+
+
+class ILikeContains(ILikeMixin, IContains):
+    """Поиск подстроки без учёта регистра: `field__ilike=value`."""
+    lookup_name = 'ilike'
+    builtin_lookup = IContains.lookup_name
+
+
+class ILikeStartsWith(ILikeMixin, IStartsWith):
+    """Поиск по началу строки без учёта регистра:
+    `field__ilike_startswith=value`."""
+    lookup_name = 'ilike_startswith'
+    builtin_lookup = IStartsWith.lookup_name
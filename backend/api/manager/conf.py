@@ -4,6 +4,41 @@
 
 DATE_TIME_FORMAT = '%d/%m/%Y %H:%M'
 
+# Количество строк, читаемых из курсора за один раз при выгрузке
+CART_CHUNK_SIZE = 500
+
+# Время хранения посчитанного списка покупок в кэше (секунды)
+CART_CACHE_TIMEOUT = 60 * 60
+
+# Префикс ключей кэша списка покупок
+CART_CACHE_PREFIX = 'shopping_cart'
+
+# Кэш токенов авторизации (см. CACHES в настройках)
+TOKEN_CACHE_ALIAS = 'tokens'
+
+# Префикс ключей кэша токенов
+TOKEN_CACHE_PREFIX = 'auth_token'
+
+# Ключ версии индекса ингредиентов в кэше
+INGREDIENT_INDEX_VERSION_KEY = 'ingredient_index:version'
+
+# Максимальное время жизни индекса ингредиентов в процессе (секунды)
+INGREDIENT_INDEX_TIMEOUT = 10 * 60
+
+# Ключ словаря `slug -> id` тегов в кэше
+TAG_MAP_CACHE_KEY = 'tags:slug_map'
+
+# Время хранения словаря тегов в кэше (секунды). Новые теги находятся
+# и раньше: при неизвестном слаге словарь перечитывается из базы
+TAG_MAP_CACHE_TIMEOUT = 10 * 60
+
+# Результаты массового добавления/удаления для каждого рецепта
+LINK_ADDED = 'added'
+LINK_EXISTS = 'exists'
+LINK_REMOVED = 'removed'
+LINK_ABSENT = 'absent'
+LINK_NOT_FOUND = 'not_found'
+
 ADD_METHODS = ('GET', 'POST',)
 
 DEL_METHODS = ('DELETE',)
@@ -54,5 +89,24 @@ MAX_COLOR_LEN = 6
 # Количество карточек на странице
 PAGE_SIZE_COUNT = 6
 
+# Параметр запроса для выбора способа пагинации (`?pagination=cursor`)
+PAGINATION_QUERY_PARAM = 'pagination'
+
+# Значение параметра для курсорной пагинации
+CURSOR_PAGINATION = 'cursor'
+
+# Параметр запроса для вывода общего количества (`?total=1`)
+TOTAL_QUERY_PARAM = 'total'
+
+# Время хранения количества объектов списка в кэше (секунды)
+COUNT_CACHE_TIMEOUT = 30
+
+# Префикс ключей кэша количества объектов списка
+COUNT_CACHE_PREFIX = 'count'
+
+# Размер таблицы, начиная с которого для списка без фильтров
+# используется оценка PostgreSQL (`pg_class.reltuples`)
+COUNT_ESTIMATE_THRESHOLD = 100_000
+
 # Лимит рецептов
 RECIPES_LIMIT = 3
@@ -0,0 +1,101 @@
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from time import monotonic, time_ns
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.models import Ingredient
+
+from .conf import INGREDIENT_INDEX_TIMEOUT, INGREDIENT_INDEX_VERSION_KEY
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса.
+
+    Хранит ингредиенты в отсортированном по названию списке и ищет
+    по префиксу бинарным поиском, не обращаясь к базе.
+    Загружается при первом поиске. Перезагружается, если сменилась
+    версия в кэше (см. `invalidate`) или истёк `INGREDIENT_INDEX_TIMEOUT`.
+    Справочник читается из основной базы, а не с реплики.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._loaded_at = None
+        # Ключи и ингредиенты заменяются одним присваиванием, чтобы
+        # поиск во время перезагрузки не смешал старый и новый индекс
+        self._index = ([], [])
+
+    def invalidate(self):
+        """Помечает устаревшими индексы всех процессов.
+
+        Версия хранится в кэше `default`, общем для всех процессов
+        (`CACHE_LOCATION`), поэтому вызов из команды (`load_ingrs`)
+        перезагружает индексы веб-воркеров при следующем поиске.
+        """
+        try:
+            cache.incr(INGREDIENT_INDEX_VERSION_KEY)
+        except ValueError:
+            cache.set(INGREDIENT_INDEX_VERSION_KEY, time_ns(), None)
+
+    def _is_actual(self, version):
+        return (
+            self._version == version
+            and monotonic() - self._loaded_at < INGREDIENT_INDEX_TIMEOUT
+        )
+
+    def _load(self):
+        cache.add(INGREDIENT_INDEX_VERSION_KEY, time_ns(), None)
+        version = cache.get(INGREDIENT_INDEX_VERSION_KEY)
+        if self._is_actual(version):
+            return
+
+        with self._lock:
+            if self._is_actual(version):
+                return
+            ingredients = sorted(
+                Ingredient.objects.using(DEFAULT_DB_ALIAS),
+                key=lambda ing: ing.name.lower()
+            )
+            self._index = (
+                [ing.name.lower() for ing in ingredients], ingredients
+            )
+            self._version = version
+            self._loaded_at = monotonic()
+
+    def search(self, *terms):
+        """Ищет ингредиенты по части названия без учёта регистра.
+
+        Несколько вариантов строки (например, набранной в другой
+        раскладке) ищутся за один проход, результаты объединяются.
+
+        Args:
+            terms (str): Варианты искомой строки.
+
+        Returns:
+            list[Ingredient]: Сначала ингредиенты, название которых
+            начинается с одного из `terms`, затем те, что содержат
+            его в середине.
+        """
+        self._load()
+        keys, ingredients = self._index
+        terms = tuple(dict.fromkeys(term.lower() for term in terms))
+
+        found = {}
+        for term in terms:
+            start = bisect_left(keys, term)
+            end = bisect_right(keys, term + chr(0x10FFFF), lo=start)
+            for ing in ingredients[start:end]:
+                found.setdefault(ing.id, ing)
+
+        return list(found.values()) + [
+            ing for key, ing in zip(keys, ingredients)
+            if any(term in key for term in terms)
+            and not key.startswith(terms)
+        ]
+
+
+ingredient_index = IngredientIndex()
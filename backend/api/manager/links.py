@@ -0,0 +1,168 @@
+"""Добавление и удаление связей (избранное, корзина, подписки).
+
+Связь добавляется одним `INSERT ... ON CONFLICT DO NOTHING RETURNING`,
+удаляется одним `DELETE ... RETURNING`. Повтор определяет уникальное
+ограничение, отсутствующий объект - внешний ключ (отложенная проверка
+срабатывает при фиксации транзакции). Сигналы `post_save`/`post_delete`
+отправляются вручную, поэтому счётчики (`recipes.signals`) обновляются
+как при `save()` и `delete()` - в той же транзакции, что и связь.
+
+Массовые `add_links`/`remove_links` меняют набор связей одним запросом
+и обновляют счётчики одним UPDATE, без сигналов на каждую строку.
+"""
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+
+from recipes.signals import change_counters
+
+
+def columns(opts, values):
+    return [opts.get_field(name).column for name in values]
+
+
+def execute_returning(model, sql, params):
+    using = router.db_for_write(model)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return using, cursor.fetchall()
+
+
+def add_link(model, **values):
+    """Добавляет связь, если её ещё нет.
+
+    Args:
+        model (Model): Модель связи, например `Favorite`.
+        values (int): Значения внешних ключей, например
+            `user_id=1, recipe_id=2`.
+
+    Raises:
+        IntegrityError: Объект, на который ссылается связь, не найден
+            (при фиксации транзакции) или нарушено ограничение модели.
+
+    Returns:
+        Model | None: Созданная связь или None, если она уже была.
+    """
+    opts = model._meta
+    quote = connections[router.db_for_write(model)].ops.quote_name
+    with transaction.atomic(using=router.db_for_write(model)):
+        using, rows = execute_returning(
+            model,
+            f'INSERT INTO {quote(opts.db_table)} ('
+            + ', '.join(quote(column) for column in columns(opts, values))
+            + ') '
+            f'VALUES ({", ".join(["%s"] * len(values))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}',
+            list(values.values()),
+        )
+        if not rows:
+            return None
+        instance = model(pk=rows[0][0], **values)
+        instance._state.adding = False
+        instance._state.db = using
+        post_save.send(sender=model, instance=instance, created=True,
+                       update_fields=None, raw=False, using=using)
+    return instance
+
+
+def remove_link(model, **values):
+    """Удаляет связь.
+
+    Args:
+        model (Model): Модель связи, например `Favorite`.
+        values (int): Значения внешних ключей связи.
+
+    Returns:
+        Model | None: Удалённая связь или None, если её не было.
+    """
+    opts = model._meta
+    quote = connections[router.db_for_write(model)].ops.quote_name
+    with transaction.atomic(using=router.db_for_write(model)):
+        using, rows = execute_returning(
+            model,
+            f'DELETE FROM {quote(opts.db_table)} WHERE '
+            + ' AND '.join(
+                f'{quote(column)} = %s' for column in columns(opts, values)
+            )
+            + f' RETURNING {quote(opts.pk.column)}',
+            list(values.values()),
+        )
+        if not rows:
+            return None
+        instance = model(pk=rows[0][0], **values)
+        instance._state.db = using
+        post_delete.send(sender=model, instance=instance, using=using,
+                         origin=instance)
+    return instance
+
+
+def add_links(model, target_field, target_ids, **values):
+    """Добавляет связи с несколькими объектами одним INSERT ... SELECT.
+
+    Вставляются только связи с существующими объектами, повторы
+    пропускаются (`ON CONFLICT DO NOTHING`).
+
+    Args:
+        model (Model): Модель связи, например `Favorite`.
+        target_field (str): Поле связи с объектом, например `recipe`.
+        target_ids (list[int]): id объектов.
+        values (int): Общие значения внешних ключей, например `user_id=1`.
+
+    Returns:
+        set[int]: id объектов, связи с которыми добавлены.
+    """
+    opts = model._meta
+    target = opts.get_field(target_field)
+    target_opts = target.related_model._meta
+    quote = connections[router.db_for_write(model)].ops.quote_name
+    with transaction.atomic(using=router.db_for_write(model)):
+        _, rows = execute_returning(
+            model,
+            f'INSERT INTO {quote(opts.db_table)} ('
+            + ', '.join(quote(column) for column in columns(opts, values))
+            + f', {quote(target.column)}) '
+            f'SELECT {", ".join(["%s"] * len(values))}, '
+            f'{quote(target_opts.pk.column)} '
+            f'FROM {quote(target_opts.db_table)} '
+            f'WHERE {quote(target_opts.pk.column)} '
+            f'IN ({", ".join(["%s"] * len(target_ids))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(target.column)}',
+            [*values.values(), *target_ids],
+        )
+        added = {row[0] for row in rows}
+        if added:
+            change_counters(model, added, 1)
+    return added
+
+
+def remove_links(model, target_field, target_ids, **values):
+    """Удаляет связи с несколькими объектами одним DELETE.
+
+    Args:
+        model (Model): Модель связи, например `Favorite`.
+        target_field (str): Поле связи с объектом, например `recipe`.
+        target_ids (list[int]): id объектов.
+        values (int): Общие значения внешних ключей, например `user_id=1`.
+
+    Returns:
+        set[int]: id объектов, связи с которыми удалены.
+    """
+    opts = model._meta
+    target = opts.get_field(target_field)
+    quote = connections[router.db_for_write(model)].ops.quote_name
+    with transaction.atomic(using=router.db_for_write(model)):
+        _, rows = execute_returning(
+            model,
+            f'DELETE FROM {quote(opts.db_table)} WHERE '
+            + ''.join(
+                f'{quote(column)} = %s AND '
+                for column in columns(opts, values)
+            )
+            + f'{quote(target.column)} '
+            f'IN ({", ".join(["%s"] * len(target_ids))}) '
+            f'RETURNING {quote(target.column)}',
+            [*values.values(), *target_ids],
+        )
+        removed = {row[0] for row in rows}
+        if removed:
+            change_counters(model, removed, -1)
+    return removed
@@ -1,45 +1,193 @@
+import csv
+import json
 from datetime import datetime as dt
+from itertools import chain
+from time import time_ns
 
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
 from django.db.models import F, Sum
-from rest_framework.response import Response
-from rest_framework.status import HTTP_400_BAD_REQUEST
 
 from recipes.models import AmountIngredient
 
-from .conf import DATE_TIME_FORMAT
+from .conf import (CART_CACHE_PREFIX, CART_CACHE_TIMEOUT, CART_CHUNK_SIZE,
+                   DATE_TIME_FORMAT)
 
 
-def download_cart(user):
+class Echo:
+    """Псевдо-буфер для `csv.writer`: отдаёт записанную строку обратно."""
+
+    def write(self, value):
+        return value
+
+
+def cart_version_key(user_id):
+    return f'{CART_CACHE_PREFIX}:{user_id}:version'
+
+
+def cart_key(user_id):
+    return f'{CART_CACHE_PREFIX}:{user_id}'
+
+
+def get_cached_cart(user_id):
+    """Читает версию списка покупок и посчитанные строки одним запросом.
+
+    Строки хранятся вместе с версией, для которой они посчитаны,
+    поэтому версия и строки читаются одним `get_many`. Начальная
+    версия берётся из текущего времени, чтобы после вытеснения ключа
+    из кэша не подхватить устаревшие данные.
+
+    Args:
+        user_id (int): id пользователя.
+
+    Returns:
+        tuple[int, list | None]: Текущая версия и строки списка покупок;
+        None, если для этой версии они ещё не посчитаны.
     """
-    Формирует будущий файл *.txt со списком покупок.
+    version_key, key = cart_version_key(user_id), cart_key(user_id)
+    cached = cache.get_many((version_key, key))
+
+    version = cached.get(version_key)
+    if version is None:
+        cache.add(version_key, time_ns(), None)
+        return cache.get(version_key), None
+
+    ingredients = cached.get(key)
+    if ingredients is not None and ingredients[0] == version:
+        return version, ingredients[1]
+    return version, None
+
+
+def invalidate_cart(*user_ids):
+    """Сбрасывает посчитанные списки покупок пользователей.
+
+    Args:
+        user_ids (int): id пользователей, чьи списки изменились.
+    """
+    for user_id in user_ids:
+        try:
+            cache.incr(cart_version_key(user_id))
+        except ValueError:
+            cache.set(cart_version_key(user_id), time_ns(), None)
+
+
+def read_cart_ingredients(user, version):
+    """Суммирует ингредиенты рецептов из списка покупок.
+
+    Строки читаются из курсора порциями и сразу отдаются дальше,
+    в кэш под версией `version` они попадают после полного чтения.
+    Читаются из основной базы: реплика может отставать от версии.
 
-    Считает сумму ингредиентов в рецептах выбранных для покупки.
-    Возвращает текстовый файл со списком ингредиентов.
-    Вызов метода через url:  */recipe/<int:id>/download_shopping_cart/.
     Args:
         user (User): Пользователь.
+        version (int): Версия списка покупок на момент чтения.
 
-    Returns:
-        String: Ответ с текстовым файлом.
+    Yields:
+        dict: Строки с ключами `ingredient`, `measure`, `amount`.
     """
-    if not user.shoppingcart.exists():
-        return Response(status=HTTP_400_BAD_REQUEST)
-    ingredients = AmountIngredient.objects.filter(
+    queryset = AmountIngredient.objects.using(DEFAULT_DB_ALIAS).filter(
         recipe__shoppingcart__user_id=user).values(
         ingredient=F('ingredients__name'),
         measure=F('ingredients__measurement_unit')).order_by(
         'ingredients__name').annotate(amount=Sum('amount'))
 
-    shopping_list = (
+    ingredients = []
+    for ing in queryset.iterator(chunk_size=CART_CHUNK_SIZE):
+        ingredients.append(ing)
+        yield ing
+
+    cache.set(cart_key(user.id), (version, ingredients), CART_CACHE_TIMEOUT)
+
+
+def cart_ingredients(user):
+    """Возвращает строки списка покупок.
+
+    При попадании в кэш запросов к базе нет, при промахе строки
+    читаются из базы потоком (`read_cart_ingredients`).
+
+    Args:
+        user (User): Пользователь.
+
+    Returns:
+        Iterator[dict]: Строки с ключами `ingredient`, `measure`, `amount`.
+    """
+    version, ingredients = get_cached_cart(user.id)
+    if ingredients is not None:
+        return iter(ingredients)
+    return read_cart_ingredients(user, version)
+
+
+def cart_txt(user, ingredients):
+    """Список покупок в текстовом виде."""
+    yield (
         f'Список покупок для:\n\n'
         f'{user.username} ({user.first_name} {user.last_name})\n\n'
         f'{dt.now().strftime(DATE_TIME_FORMAT)}\n\n'
     )
     for ing in ingredients:
-        shopping_list += (
-            f'{ing["ingredient"]}: {ing["amount"]} {ing["measure"]}\n'
+        yield f'{ing["ingredient"]}: {ing["amount"]} {ing["measure"]}\n'
+
+    yield '\n\nПосчитано в Foodgram'
+
+
+def cart_csv(user, ingredients):
+    """Список покупок в виде таблицы *.csv."""
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единицы измерения'))
+    for ing in ingredients:
+        yield writer.writerow(
+            (ing['ingredient'], ing['amount'], ing['measure'])
         )
 
-    shopping_list += '\n\nПосчитано в Foodgram'
 
-    return shopping_list
+def cart_json(user, ingredients):
+    """Список покупок в виде документа *.json."""
+    yield (
+        f'{{"user": {json.dumps(user.username, ensure_ascii=False)}, '
+        f'"created": "{dt.now().strftime(DATE_TIME_FORMAT)}", '
+        f'"ingredients": ['
+    )
+    separator = ''
+    for ing in ingredients:
+        yield separator + json.dumps(
+            {'name': ing['ingredient'],
+             'amount': ing['amount'],
+             'measurement_unit': ing['measure']},
+            ensure_ascii=False
+        )
+        separator = ', '
+
+    yield ']}'
+
+
+CART_WRITERS = {
+    'txt': cart_txt,
+    'csv': cart_csv,
+    'json': cart_json,
+}
+
+
+def download_cart(user, file_format='txt'):
+    """
+    Формирует будущий файл со списком покупок.
+
+    Считает сумму ингредиентов в рецептах выбранных для покупки.
+    Файл не собирается в памяти целиком: строки отдаются по мере
+    чтения из базы. Пустота списка определяется по первой строке,
+    отдельный запрос для этого не нужен.
+    Вызов метода через url:  */recipe/download_shopping_cart/?format=csv.
+
+    Args:
+        user (User): Пользователь.
+        file_format (str): Формат файла - `txt`, `csv` или `json`.
+
+    Returns:
+        Iterator[str] | None: Части файла со списком покупок;
+        None, если список покупок пуст.
+    """
+    ingredients = cart_ingredients(user)
+    first = next(ingredients, None)
+    if first is None:
+        return None
+    return CART_WRITERS[file_format](user, chain((first,), ingredients))
@@ -0,0 +1,39 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.models import Tag
+
+from .conf import TAG_MAP_CACHE_KEY, TAG_MAP_CACHE_TIMEOUT
+
+
+def tag_slug_map(slugs=()):
+    """Возвращает соответствие слагов тегов их id.
+
+    Словарь хранится в кэше и сбрасывается сигналами при изменении
+    тегов (см. `api.signals`). Сигналы срабатывают только в процессе,
+    где изменили теги, поэтому если каких-то из `slugs` в словаре нет,
+    он перечитывается из базы: тег могли добавить в другом процессе
+    (`load_tags`, `load_dump`, другой воркер). Словарь читается
+    из основной базы, а не с реплики.
+
+    Args:
+        slugs (Iterable[str]): Слаги, которые нужны вызывающему.
+
+    Returns:
+        dict[str, int]: Словарь `slug -> id`.
+    """
+    slug_map = cache.get(TAG_MAP_CACHE_KEY)
+    if slug_map is None or not slug_map.keys() >= set(slugs):
+        slug_map = dict(
+            Tag.objects.using(DEFAULT_DB_ALIAS).values_list('slug', 'id')
+        )
+        cache.set(TAG_MAP_CACHE_KEY, slug_map, TAG_MAP_CACHE_TIMEOUT)
+    return slug_map
+
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_slug_map()]
+
+
+def invalidate_tag_map():
+    cache.delete(TAG_MAP_CACHE_KEY)
@@ -1,6 +1,127 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from hashlib import md5
+from time import time_ns
 
-from api.manager.conf import PAGE_SIZE_COUNT
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from api.manager.conf import (COUNT_CACHE_PREFIX, COUNT_CACHE_TIMEOUT,
+                              COUNT_ESTIMATE_THRESHOLD, CURSOR_PAGINATION,
+                              PAGE_SIZE_COUNT, PAGINATION_QUERY_PARAM,
+                              SYMBOL_TRUE_SEARCH, TOTAL_QUERY_PARAM)
+
+
+def estimate_count(queryset):
+    """Оценивает количество строк в выборке без `COUNT(*)`.
+
+    На PostgreSQL берёт оценку планировщика из `EXPLAIN`,
+    на остальных базах считает точно.
+
+    Args:
+        queryset (QuerySet): Выборка.
+
+    Returns:
+        tuple[int, bool]: Количество и признак того, что оно оценочное.
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count(), False
+
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+
+def estimate_table_rows(model, using):
+    """Возвращает оценку числа строк в таблице модели.
+
+    Оценку (`pg_class.reltuples`) обновляют `ANALYZE` и autovacuum,
+    поэтому она хранится в кэше на `COUNT_CACHE_TIMEOUT` секунд.
+
+    Args:
+        model (Model): Модель, размер таблицы которой нужен.
+        using (str): Псевдоним базы данных.
+
+    Returns:
+        int: Оценка числа строк; -1, если оценки нет.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return -1
+
+    key = f'{COUNT_CACHE_PREFIX}:estimate:{using}:{model._meta.db_table}'
+    estimate = cache.get(key)
+    if estimate is not None:
+        return estimate
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    estimate = int(row[0]) if row else -1
+    cache.set(key, estimate, COUNT_CACHE_TIMEOUT)
+    return estimate
+
+
+def count_version_key(model):
+    return f'{COUNT_CACHE_PREFIX}:{model._meta.label_lower}:version'
+
+
+def invalidate_counts(model):
+    """Сбрасывает закэшированные количества всех списков модели.
+
+    Args:
+        model (Model): Модель, объекты которой добавлены или удалены.
+    """
+    try:
+        cache.incr(count_version_key(model))
+    except ValueError:
+        cache.set(count_version_key(model), time_ns(), None)
+
+
+class LookaheadPage(Page):
+    """Страница, наличие следующей страницы у которой известно заранее."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class LookaheadPaginator(Paginator):
+    """
+    Пагинатор, который не проверяет страницы по количеству объектов.
+    Количество (`count`) задаётся снаружи и может быть устаревшим или
+    оценочным, поэтому страница выбирается с одним лишним объектом:
+    по нему определяется следующая страница, по пустой выборке -
+    несуществующая.
+    """
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return LookaheadPage(objects[:self.per_page], number, self,
+                             has_next=len(objects) > self.per_page)
 
 
 class PageLimitPagination(PageNumberPagination):
@@ -10,3 +131,144 @@ class PageLimitPagination(PageNumberPagination):
     """
     page_size = PAGE_SIZE_COUNT
     page_size_query_param = 'limit'
+
+
+class CachedCountPagination(PageLimitPagination):
+    """
+    Пагинатор, который не считает `COUNT(*)` на каждый запрос.
+    Количество кэшируется по набору параметров фильтрации на
+    `count_cache_timeout` секунд и сбрасывается при добавлении
+    и удалении объектов (`invalidate_counts`). Для списка без фильтров
+    при таблице больше `count_estimate_threshold` строк берётся оценка
+    PostgreSQL. Признак оценки выводится в поле `count_estimated`.
+    Количество только выводится: существование страницы и ссылка
+    на следующую определяются по самой выборке (`LookaheadPaginator`).
+    Фильтры, результат которых зависит от пользователя, меняются его же
+    действиями, поэтому с ними количество считается каждый раз.
+    """
+    count_cache_timeout = COUNT_CACHE_TIMEOUT
+    count_estimate_threshold = COUNT_ESTIMATE_THRESHOLD
+    # Фильтры, результат которых зависит от пользователя
+    user_filter_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def get_filter_params(self):
+        """Приводит параметры фильтрации к однозначному виду.
+
+        Returns:
+            tuple: Отсортированные пары (параметр, значения) без
+            параметров пагинации.
+        """
+        skip = (self.page_query_param, self.page_size_query_param, 'format')
+        return tuple(sorted(
+            (key, tuple(sorted(values)))
+            for key, values in self.request.query_params.lists()
+            if key not in skip
+        ))
+
+    def get_count(self, queryset):
+        """Возвращает количество объектов и признак оценки.
+
+        Args:
+            queryset (QuerySet): Отфильтрованная выборка.
+
+        Returns:
+            tuple[int, bool]: Количество и признак того,
+            что оно оценочное.
+        """
+        params = self.get_filter_params()
+
+        if not params:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate >= self.count_estimate_threshold:
+                return estimate, True
+
+        if any(key in self.user_filter_params for key, _ in params):
+            return queryset.count(), False
+
+        version_key = count_version_key(queryset.model)
+        key = '{}:{}:{}'.format(
+            COUNT_CACHE_PREFIX, self.request.path,
+            md5(repr(params).encode()).hexdigest()
+        )
+        cached = cache.get_many((version_key, key))
+        version = cached.get(version_key)
+        if version is None:
+            cache.add(version_key, time_ns(), None)
+            version = cache.get(version_key)
+        elif key in cached and cached[key][0] == version:
+            return cached[key][1], False
+
+        count = queryset.using(DEFAULT_DB_ALIAS).count()
+        cache.set(key, (version, count), self.count_cache_timeout)
+        return count, False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        """Создаёт пагинатор с уже известным количеством."""
+        paginator = LookaheadPaginator(object_list, per_page)
+        paginator.count, self.count_estimated = self.get_count(object_list)
+        return paginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_estimated'] = self.count_estimated
+        return response
+
+
+class CursorLimitPagination(CursorPagination):
+    """
+    Курсорный пагинатор для рецептов.
+    Не выполняет `COUNT(*)` и `OFFSET`: следующая страница выбирается
+    по `pub_date` последнего рецепта, поэтому дальние страницы
+    не медленнее первых. Общее количество выводится только
+    по запросу `?total=1` и может быть оценочным.
+    """
+    page_size = PAGE_SIZE_COUNT
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    total_query_param = TOTAL_QUERY_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if (request.query_params.get(self.total_query_param, '').lower()
+                in SYMBOL_TRUE_SEARCH):
+            self.count, self.count_estimated = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        content = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            content['count'] = self.count
+            content['count_estimated'] = self.count_estimated
+        return Response(content)
+
+
+class IdCursorLimitPagination(CursorLimitPagination):
+    """
+    Курсорный пагинатор для подписок и пользователей.
+    """
+    ordering = ('-id',)
+
+
+class CursorPaginationMixin:
+    """
+    Включает курсорную пагинацию по запросу `?pagination=cursor`.
+    Без параметра используется `pagination_class` представления.
+    """
+    cursor_pagination_class = CursorLimitPagination
+
+    @property
+    def paginator(self):
+        if (self.request.query_params.get(PAGINATION_QUERY_PARAM)
+                != CURSOR_PAGINATION):
+            return super().paginator
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.cursor_pagination_class()
+        return self._paginator
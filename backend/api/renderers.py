@@ -0,0 +1,48 @@
+from rest_framework.renderers import BaseRenderer
+
+
+def error_text(data):
+    """Собирает текст сообщения из ответа DRF.
+
+    Ошибки приходят словарём (`{'detail': ...}` или `{'поле': [...]}`)
+    либо списком, строки берутся из них без `repr`.
+
+    Args:
+        data (dict | list | str): Данные ответа.
+
+    Returns:
+        str: Сообщения, по одному на строку.
+    """
+    if isinstance(data, dict):
+        if set(data) == {'detail'}:
+            return error_text(data['detail'])
+        return '\n'.join(
+            f'{key}: {error_text(value)}' for key, value in data.items()
+        )
+    if isinstance(data, (list, tuple)):
+        return '\n'.join(error_text(value) for value in data)
+    return str(data)
+
+
+class PlainTextRenderer(BaseRenderer):
+    """
+    Рендерер для выгрузки списка покупок в формате *.txt.
+    Сам файл отдаётся потоком, рендерер нужен для согласования
+    формата и вывода сообщений об ошибках.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return error_text(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """
+    Рендерер для выгрузки списка покупок в формате *.csv.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
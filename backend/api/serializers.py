@@ -1,30 +1,60 @@
+from functools import partial
+
+from django.conf import settings
 from django.db.models import PositiveSmallIntegerField
-from django.shortcuts import get_object_or_404
+from django.db.transaction import atomic, on_commit
 from drf_extra_fields.fields import Base64ImageField
-from rest_framework.fields import IntegerField, ReadOnlyField
+from rest_framework.fields import IntegerField, ListField, ReadOnlyField
 from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.serializers import (ModelSerializer, SerializerMethodField,
-                                        ValidationError)
+from rest_framework.serializers import (ModelSerializer, Serializer,
+                                        SerializerMethodField, ValidationError)
 
-from api.manager.conf import (ADD_METHODS, DEL_METHODS,
-                              MAX_LEN_USERS_CHARFIELD, MAX_VALUE_COOKING,
+from api.manager.conf import (MAX_LEN_USERS_CHARFIELD, MAX_VALUE_COOKING,
                               MIN_AMOUNT_INGREDIENT, MIN_USERNAME_LENGTH,
                               MIN_VALUE_COOKING, RECIPES_LIMIT)
-from api.validators import search_duplications
+from api.manager.order_cart import invalidate_cart
+from api.validators import unique_validate
+from recipes.manager.conf import IMAGE_CARD_SIZE, IMAGE_READY, IMAGE_THUMB_SIZE
+from recipes.manager.images import enqueue_recipe_image
 from recipes.models import (AmountIngredient, Favorite, Ingredient, OrderCart,
                             Recipe, Tag)
 from users.models import Subscribe, User
 
 
-class ShortRecipeSerializer(ModelSerializer):
+class ImageSrcsetMixin:
+    """Добавляет `image_srcset` - варианты изображения для `<img srcset>`.
+
+    Пока изображение в обработке (`image_status`), возвращается пустая
+    строка и клиент использует основное изображение `image`.
+    """
+
+    def get_image_srcset(self, obj):
+        if obj.image_status != IMAGE_READY:
+            return ''
+        request = self.context.get('request')
+        srcset = []
+        for image, (width, _) in (
+            (obj.image_thumb, IMAGE_THUMB_SIZE),
+            (obj.image_card, IMAGE_CARD_SIZE),
+        ):
+            if image:
+                url = request.build_absolute_uri(image.url) if request \
+                    else image.url
+                srcset.append(f'{url} {width}w')
+        return ', '.join(srcset)
+
+
+class ShortRecipeSerializer(ImageSrcsetMixin, ModelSerializer):
     """Сериализатор для модели Recipe.
     Определён укороченный набор полей для некоторых эндпоинтов.
     """
+    image_srcset = SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'cooking_time',
+            'id', 'name', 'image', 'image_srcset', 'image_status',
+            'cooking_time',
         )
         read_only_fields = (
             'id', 'name', 'image', 'cooking_time',
@@ -76,6 +106,7 @@ class UserSerializer(ModelSerializer):
 
         Определяет - подписан ли текущий пользователь
         на просматриваемого пользователя.
+        Если значение уже аннотировано, запрос не выполняется.
 
         Args:
             obj (User): Пользователь, на которого проверяется подписка.
@@ -83,6 +114,9 @@ class UserSerializer(ModelSerializer):
         Returns:
             bool: True, если подписка есть. Во всех остальных случаях False.
         """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
 
         return (
@@ -116,44 +150,35 @@ class UserSerializer(ModelSerializer):
 
 
 class UserSubscribeSerializer(ModelSerializer):
-    """Сериализатор для проверки подписок
+    """Сериализатор для вывода подписки.
+
+    Подписка создаётся и удаляется в `UserViewSet.subscribe`
+    (`api.manager.links`), здесь - только сообщения об ошибках и вывод.
     """
+    default_error_messages = {
+        'self': 'Вы не можете подписаться на самого себя нельзя',
+        'exists': 'Вы уже подписаны на этого автора',
+        'not_found': 'Вы уже отписались от этого автора',
+    }
 
     class Meta:
         model = Subscribe
         fields = ('user', 'author')
 
-    def validate(self, data):
-        user = data['user']
-        author = data['author']
-        subscribed = Subscribe.objects.filter(
-            user=user, author=author
-        ).exists()
-
-        if self.context.get('request').method in ADD_METHODS:
-            if user == author:
-                raise ValidationError(
-                    'Вы не можете подписаться на самого себя нельзя'
-                )
-            if subscribed:
-                raise ValidationError(
-                    'Вы уже подписаны на этого автора'
-                )
-
-        if self.context.get('request').method in DEL_METHODS:
-            if not subscribed:
-                raise ValidationError(
-                    'Вы уже отписались от этого автора'
-                )
-        return data
-
     def to_representation(self, instance):
-        """Метод представления модели"""
+        """Метод представления модели.
+
+        Подписка всегда принадлежит запрашивающему пользователю,
+        поэтому флаг `is_subscribed` известен без запроса.
+        """
+        request = self.context.get('request')
+        author = instance.author
+        author.is_subscribed = instance.user_id == request.user.id
 
         serializer = UserViewSerializer(
-            instance.author,
+            author,
             context={
-                'request': self.context.get('request')
+                'request': request
             }
         )
         return serializer.data
@@ -164,41 +189,54 @@ class UserViewSerializer(UserSerializer):
     Сериализатор представления подписок
     """
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
+    recipes_count = ReadOnlyField()
+    subscribers_count = ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         model = User
         fields = UserSerializer.Meta.fields + (
             'recipes',
             'recipes_count',
+            'subscribers_count',
         )
 
-    def get_recipes(self, obj):
-        """ Показывает рецепты у автора в сокращенном виде
+    @staticmethod
+    def get_recipes_limit(request):
+        """ Читает параметр `recipes_limit` из запроса.
+
         Args:
-            obj (User): Запрошенный автор
+            request (Request): Запрос.
+
+        Returns:
+            int | None: Сколько рецептов выводить у автора;
+            None - выводить все.
         """
-        request = self.context.get('request')
         recipes_limit = request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            return RECIPES_LIMIT
+        return recipes_limit if recipes_limit >= 0 else RECIPES_LIMIT
 
-        queryset = obj.recipes.all()
-        if recipes_limit:
-            try:
-                queryset = queryset[:int(recipes_limit)]
-            except ValueError:
-                queryset = queryset[:int(RECIPES_LIMIT)]
-        return ShortRecipeSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        """ Показывает общее количество рецептов у каждого автора.
+    def get_recipes(self, obj):
+        """ Показывает рецепты у автора в сокращенном виде
+        Если рецепты подгружены заранее (`recipes_preview`),
+        запрос не выполняется.
 
         Args:
             obj (User): Запрошенный автор
-
-        Returns:
-            int: Количество рецептов созданных запрошенным пользователем.
         """
-        return obj.recipes.count()
+        if hasattr(obj, 'recipes_preview'):
+            return ShortRecipeSerializer(obj.recipes_preview, many=True).data
+
+        recipes_limit = self.get_recipes_limit(self.context.get('request'))
+
+        queryset = obj.recipes.all()
+        if recipes_limit is not None:
+            queryset = queryset[:recipes_limit]
+        return ShortRecipeSerializer(queryset, many=True).data
 
 
 class TagSerializer(ModelSerializer):
@@ -289,6 +327,8 @@ class RecipeSerializer(ModelSerializer):
 
         Создаёт объект AmountIngredient связывающий объекты Recipe и
         Ingredient с указанием количества(`amount`) конкретного ингридиента.
+        Существование ингредиентов проверено в `validate`, поэтому
+        связь задаётся по id без загрузки объектов.
 
         Args:
             recipe (Recipe):
@@ -301,8 +341,7 @@ class RecipeSerializer(ModelSerializer):
         AmountIngredient.objects.bulk_create(
             [AmountIngredient(
                 recipe=recipe,
-                ingredients=get_object_or_404(Ingredient,
-                                              id=ingredient.get('id')),
+                ingredients_id=ingredient.get('id'),
                 amount=ingredient.get('amount')
             ) for ingredient in ingredients]
         )
@@ -329,6 +368,25 @@ class RecipeSerializer(ModelSerializer):
                 'Время: Поле должно быть только числом!'
             )
 
+    def check_ingredients_exist(self, ingredients):
+        """Проверяет, что все ингредиенты есть в базе, одним запросом.
+
+        Args:
+            ingredients (list): Ингредиенты рецепта.
+
+        Raises:
+            ValidationError: Перечислены все ненайденные id.
+        """
+        ids = {ingredient['id'] for ingredient in ingredients}
+        missing = ids - set(
+            Ingredient.objects.filter(id__in=ids).values_list('id', flat=True)
+        )
+        if missing:
+            raise ValidationError(
+                'ingredients: Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}'
+            )
+
     def validate(self, data):
         """Проверка вводных данных при создании/редактировании рецепта.
 
@@ -356,25 +414,22 @@ class RecipeSerializer(ModelSerializer):
                 'ingredients: Отсутствует какой-либо ингридиент!'
             )
 
-        valid_ingredients = []
-
         for ing in ingredients:
-            ing_id = ing.get('id')
-
             self.check_amount(ing.get('amount'))
-            if search_duplications(valid_ingredients,
-                                   'id', ing_id):
-                raise ValidationError(
-                    'Поля не должны повторяться!'
-                )
 
-            valid_ingredients.append(ing)
+        unique_validate(data['ingredients'], [tag.id for tag in data['tags']])
+        self.check_ingredients_exist(data['ingredients'])
 
         return data
 
+    @atomic
     def create(self, validated_data):
         """Создаёт рецепт.
 
+        Рецепт, его связи и счётчик автора записываются в одной
+        транзакции. Изображение сохраняется как есть и ставится
+        в очередь на обработку (`image_status` = pending).
+
         Args:
             validated_data (dict): Данные для создания рецепта.
 
@@ -388,11 +443,89 @@ class RecipeSerializer(ModelSerializer):
                                        **validated_data)
         recipe.tags.set(tags)
         self.recipe_amount_ingredients_set(recipe, ingredients)
+        enqueue_recipe_image(recipe)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        """Приводит теги рецепта к переданному набору.
+
+        Удаляются и добавляются только отличающиеся связи.
+
+        Args:
+            recipe (Recipe): Рецепт для изменения.
+            tags (list): Новый набор тегов.
+
+        Returns:
+            bool: True, если теги изменились.
+        """
+        through = Recipe.tags.through
+        current = set(
+            through.objects.filter(recipe_id=recipe.id)
+            .values_list('tag_id', flat=True)
+        )
+        new = {tag.id for tag in tags}
+
+        if current - new:
+            through.objects.filter(recipe_id=recipe.id,
+                                   tag_id__in=current - new).delete()
+        if new - current:
+            through.objects.bulk_create(
+                [through(recipe_id=recipe.id, tag_id=tag_id)
+                 for tag_id in new - current]
+            )
+        return current != new
+
+    def update_ingredients(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к переданному списку.
+
+        Новые ингредиенты добавляются, отсутствующие удаляются,
+        у оставшихся обновляется только изменившееся количество.
+
+        Args:
+            recipe (Recipe): Рецепт для изменения.
+            ingredients (list): Новый список ингредиентов и количества.
+
+        Returns:
+            bool: True, если ингредиенты изменились.
+        """
+        current = {
+            amount.ingredients_id: amount
+            for amount in AmountIngredient.objects.filter(recipe_id=recipe.id)
+        }
+        new = {ingredient['id']: ingredient['amount']
+               for ingredient in ingredients}
+
+        removed = current.keys() - new.keys()
+        added = [{'id': ing_id, 'amount': new[ing_id]}
+                 for ing_id in new.keys() - current.keys()]
+        changed = []
+        for ing_id in current.keys() & new.keys():
+            if current[ing_id].amount != new[ing_id]:
+                current[ing_id].amount = new[ing_id]
+                changed.append(current[ing_id])
+
+        if removed:
+            AmountIngredient.objects.filter(
+                recipe_id=recipe.id, ingredients_id__in=removed
+            ).delete()
+        if changed:
+            AmountIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            self.recipe_amount_ingredients_set(recipe, added)
+
+        return bool(removed or changed or added)
+
+    @atomic
     def update(self, recipe, validated_data):
         """Обновляет рецепт.
 
+        Теги и ингредиенты сравниваются с текущими, записываются
+        только изменения. Всё выполняется в одной транзакции,
+        рецепт сохраняется один раз. Новое изображение ставится
+        в очередь на обработку. Списки покупок с этим рецептом
+        сбрасываются после фиксации: иначе выгрузка между сбросом
+        и фиксацией сохранила бы старый список под новой версией.
+
         Args:
             recipe (Recipe): Рецепт для изменения.
             validated_data (dict): Изменённые данные.
@@ -403,23 +536,30 @@ class RecipeSerializer(ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
 
-        recipe.tags.clear()
-        recipe.tags.set(tags)
-        recipe.ingredients.clear()
+        self.update_tags(recipe, tags)
+        if self.update_ingredients(recipe, ingredients):
+            users = recipe.shoppingcart.values_list('user_id', flat=True)
+            on_commit(partial(invalidate_cart, *users))
 
-        self.recipe_amount_ingredients_set(recipe, ingredients)
-
-        recipe.save()
-
-        return super().update(recipe, validated_data)
+        recipe = super().update(recipe, validated_data)
+        if 'image' in validated_data:
+            enqueue_recipe_image(recipe)
+        return recipe
 
     def to_representation(self, instance):
+        """Выводит сохранённый рецепт как `RecipeReadSerializer`.
+
+        Рецепт перечитывается через `RecipeQuerySet.for_read`, чтобы
+        вывод не делал отдельный запрос на каждый ингредиент.
+        """
+        request = self.context.get('request')
+        instance = Recipe.objects.for_read(request.user).get(pk=instance.pk)
         return RecipeReadSerializer(instance, context={
-            'request': self.context.get('request')
+            'request': request
         }).data
 
 
-class RecipeReadSerializer(ModelSerializer):
+class RecipeReadSerializer(ImageSrcsetMixin, ModelSerializer):
     tags = TagSerializer(
         read_only=True,
         many=True
@@ -434,8 +574,10 @@ class RecipeReadSerializer(ModelSerializer):
     )
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = SerializerMethodField()
 
     is_favorited = SerializerMethodField()
+    favorites_count = ReadOnlyField()
 
     class Meta:
         model = Recipe
@@ -448,17 +590,36 @@ class RecipeReadSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
+            'image_status',
             'text',
             'cooking_time',
+            'favorites_count',
         )
         read_only_fields = (
             'is_in_shopping_cart_cart',
             'is_favorited',
         )
 
+    def to_representation(self, instance):
+        """Передаёт автору аннотированный флаг подписки.
+
+        Args:
+            instance (Recipe): Рецепт для вывода.
+
+        Returns:
+            dict: Представление рецепта.
+        """
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         """Проверка - находится ли рецепт в избранном.
 
+        Если рецепт получен через `RecipeQuerySet.with_user_flags`,
+        значение уже аннотировано и запрос не выполняется.
+
         Args:
             obj (Recipe): Переданный для проверки рецепт.
 
@@ -466,6 +627,9 @@ class RecipeReadSerializer(ModelSerializer):
             bool: True - если рецепт в `избранном`
             у запращивающего пользователя, иначе - False.
         """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -476,6 +640,9 @@ class RecipeReadSerializer(ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         """Проверка - находится ли рецепт в списке  покупок.
 
+        Если рецепт получен через `RecipeQuerySet.with_user_flags`,
+        значение уже аннотировано и запрос не выполняется.
+
         Args:
             obj (Recipe): Переданный для проверки рецепт.
 
@@ -483,6 +650,9 @@ class RecipeReadSerializer(ModelSerializer):
             bool: True - если рецепт в `списке покупок`
             у запращивающего пользователя, иначе - False.
         """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         user = self.context.get('request').user
 
         return (
@@ -494,30 +664,16 @@ class RecipeReadSerializer(ModelSerializer):
 
 
 class FavoriteSerializer(ModelSerializer):
+    """Вывод рецепта из связи и сообщения об ошибках для неё."""
+    default_error_messages = {
+        'exists': 'Вы уже добавили этот рецепт в избранное!',
+        'not_found': 'Рецепт не был добавлен в избранное или уже был удален!',
+    }
+
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user_id = self.initial_data.get('user')
-        recipe_id = self.initial_data.get('recipe')
-
-        if self.context.get('request').method in ADD_METHODS:
-            if Favorite.objects.filter(user_id=user_id,
-                                       recipe_id=recipe_id).exists():
-                raise ValidationError(
-                    'Вы уже добавили этот рецепт в избранное!'
-                )
-
-        if self.context.get('request').method in DEL_METHODS:
-            if not Favorite.objects.filter(user_id=user_id,
-                                           recipe_id=recipe_id).exists():
-                raise ValidationError(
-                    'Рецепт не был добавлен в избранное или уже был удален!'
-                )
-
-        return data
-
     def to_representation(self, instance):
         """Метод представления модели"""
 
@@ -531,30 +687,16 @@ class FavoriteSerializer(ModelSerializer):
 
 
 class OrderCartSerializer(ModelSerializer):
+    """Вывод рецепта из связи и сообщения об ошибках для неё."""
+    default_error_messages = {
+        'exists': 'Вы уже добавили этот рецепт в корзину!',
+        'not_found': 'Рецепт не был добавлен в корзину или уже был удален!',
+    }
+
     class Meta:
         model = OrderCart
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user_id = self.initial_data.get('user')
-        recipe_id = self.initial_data.get('recipe')
-
-        if self.context.get('request').method in ADD_METHODS:
-            if OrderCart.objects.filter(user_id=user_id,
-                                        recipe_id=recipe_id).exists():
-                raise ValidationError(
-                    'Вы уже добавили этот рецепт в корзину!'
-                )
-
-        if self.context.get('request').method in DEL_METHODS:
-            if not OrderCart.objects.filter(user_id=user_id,
-                                            recipe_id=recipe_id).exists():
-                raise ValidationError(
-                    'Рецепт не был добавлен в корзину или уже был удален!'
-                )
-
-        return data
-
     def to_representation(self, instance):
         """Метод представления модели"""
 
@@ -565,3 +707,23 @@ class OrderCartSerializer(ModelSerializer):
             }
         )
         return serializer.data
+
+
+class RecipeIdsSerializer(Serializer):
+    """Список id рецептов для массового добавления/удаления.
+
+    Повторы отбрасываются, порядок сохраняется. Размер списка
+    ограничен настройкой `BULK_LINKS_MAX`.
+    """
+
+    def get_fields(self):
+        return {
+            'recipes': ListField(
+                child=IntegerField(min_value=1),
+                allow_empty=False,
+                max_length=settings.BULK_LINKS_MAX,
+            ),
+        }
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
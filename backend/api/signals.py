@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.db.models.signals import post_delete, post_save
+from django.db.transaction import on_commit
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens
+from api.manager.ingredient_index import ingredient_index
+from api.manager.tag_map import invalidate_tag_map
+from api.paginators import invalidate_counts
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при изменении справочника."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает словарь слагов тегов при изменении тегов."""
+    invalidate_tag_map()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_counts(using, **kwargs):
+    """Сбрасывает количества рецептов в списках после фиксации.
+
+    Изменение рецепта тоже сбрасывает их: вместе с ним меняются теги.
+    """
+    on_commit(partial(invalidate_counts, Recipe), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Сбрасывает кэш удалённого токена (logout, удаление пользователя)."""
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, **kwargs):
+    """Сбрасывает кэш токенов при изменении пользователя.
+
+    Так смена пароля, деактивация или изменение прав применяются
+    сразу, а не по истечении времени жизни записи.
+    """
+    if not created:
+        invalidate_tokens(*Token.objects.filter(
+            user_id=instance.pk
+        ).values_list('key', flat=True))
@@ -0,0 +1,659 @@
+"""Тесты API `Foodgram`.
+
+Запуск: `python manage.py test api`.
+"""
+from time import sleep
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, router
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache_key
+from api.manager.conf import TOKEN_CACHE_ALIAS
+from api.manager.ingredient_index import ingredient_index
+from api.manager.order_cart import get_cached_cart
+from foodgram.db_router import REPLICA_DATABASE, RoutingState, routing_state
+from recipes.models import AmountIngredient, Favorite, Ingredient, Recipe, Tag
+from users.models import User
+
+RECIPES_COUNT = 12
+
+INGREDIENTS_PER_RECIPE = 3
+
+
+class RecipeReadQueriesTest(TestCase):
+    """Число запросов при выводе рецептов не зависит от их количества.
+
+    Список: количество (`COUNT`), страница рецептов с автором и флагами
+    пользователя, теги, ингредиенты. Рецепт: он сам, теги, ингредиенты.
+    """
+    LIST_QUERIES = 4
+    RETRIEVE_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader',
+            first_name='Reader', last_name='Reader', password='pass',
+        )
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author',
+            first_name='Author', last_name='Author', password='pass',
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {n}', color='#FFFFFF', slug=f'tag{n}')
+            for n in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {n}', measurement_unit='г')
+            for n in range(RECIPES_COUNT + INGREDIENTS_PER_RECIPE)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {n}', text='Описание',
+                   image='recipe_images/recipe.png', cooking_time=10)
+            for n in range(RECIPES_COUNT)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes for tag in tags
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredients=ingredient, amount=5)
+            for n, recipe in enumerate(recipes)
+            for ingredient in ingredients[n:n + INGREDIENTS_PER_RECIPE]
+        )
+        cls.user.favorites.create(recipe=recipes[0])
+        cls.user.shoppingcart.create(recipe=recipes[1])
+        cls.user.subscriber.create(author=author)
+        cls.recipe = recipes[0]
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.force_authenticate(self.user)
+
+    def test_list_queries(self):
+        for name, client in (('anonymous', self.anonymous),
+                             ('authorized', self.authorized)):
+            for limit in (1, 6, RECIPES_COUNT):
+                with self.subTest(client=name, limit=limit):
+                    cache.clear()
+                    with self.assertNumQueries(self.LIST_QUERIES):
+                        response = client.get(
+                            '/api/recipes/', {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+                    self.assertEqual(
+                        len(response.data['results'][0]['ingredients']),
+                        INGREDIENTS_PER_RECIPE,
+                    )
+
+    def test_retrieve_queries(self):
+        for name, client in (('anonymous', self.anonymous),
+                             ('authorized', self.authorized)):
+            with self.subTest(client=name):
+                with self.assertNumQueries(self.RETRIEVE_QUERIES):
+                    response = client.get(f'/api/recipes/{self.recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['tags']), 3)
+
+    def test_user_flags(self):
+        response = self.authorized.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+
+        response = self.anonymous.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+
+class ShoppingCartDownloadTest(TestCase):
+    """Выгрузка списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@foodgram.ru', username='buyer',
+            first_name='Buyer', last_name='Buyer', password='pass',
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {n}', text='Описание',
+                   image='recipe_images/recipe.png', cooking_time=10)
+            for n in range(2)
+        )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(recipe=recipe, ingredients=cls.ingredient,
+                             amount=100)
+            for recipe in cls.recipes
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_errors_are_plain_text(self):
+        url = '/api/recipes/download_shopping_cart/'
+        for client, params, status, text in (
+            (APIClient(), {}, 401, 'Учетные данные не были предоставлены.'),
+            (self.client, {'format': 'pdf'}, 404, 'Страница не найдена.'),
+            (self.client, {}, 400, 'Список покупок пуст'),
+        ):
+            with self.subTest(status=status):
+                response = client.get(url, params)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.content.decode(), text)
+
+    def test_recipe_update_resets_cart_after_commit(self):
+        recipe = self.recipes[0]
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        version, _ = get_cached_cart(self.user.id)
+        tag = Tag.objects.create(name='Обед', color='#FFFFFF', slug='lunch')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'name': recipe.name, 'text': 'Описание', 'cooking_time': 10,
+                 'tags': [tag.id],
+                 'ingredients': [{'id': self.ingredient.id, 'amount': 7}]},
+                format='json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_cached_cart(self.user.id)[0], version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_cached_cart(self.user.id)[0], version)
+
+    def test_repeat_download_uses_cache(self):
+        url = '/api/recipes/download_shopping_cart/'
+        self.client.post(f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        response = self.client.get(url)
+        self.assertIn('Мука: 100 г', b''.join(response.streaming_content)
+                      .decode())
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content).decode()
+        self.assertIn('Мука: 100 г', content)
+
+        self.client.post(f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertIn('Мука,200,г', b''.join(response.streaming_content)
+                      .decode())
+
+
+class RecipeSearchTest(TestCase):
+    """Поиск рецептов `?search=`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='cook@foodgram.ru', username='cook',
+            first_name='Cook', last_name='Cook', password='pass',
+        )
+        cheese = Ingredient.objects.create(name='Cheddar',
+                                           measurement_unit='г')
+        recipes = {
+            name: Recipe.objects.create(
+                author=author, name=name, text=text,
+                image='recipe_images/recipe.png', cooking_time=10,
+            )
+            for name, text in (
+                ('Soup', 'With cheese on top'),
+                ('Pasta', 'Boil'),
+                ('Home cheesecake', 'Bake'),
+                ('Cheese pie', 'Bake'),
+                ('Salad', 'Mix'),
+            )
+        }
+        AmountIngredient.objects.create(
+            recipe=recipes['Pasta'], ingredients=cheese, amount=50
+        )
+
+    def test_search_ranking(self):
+        response = APIClient().get('/api/recipes/', {'search': 'CHE'})
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Cheese pie', 'Home cheesecake', 'Pasta', 'Soup'],
+        )
+        self.assertEqual(response.data['count'], 4)
+
+    def test_search_cyrillic_ignores_case(self):
+        author = User.objects.get(username='cook')
+        Recipe.objects.create(
+            author=author, name='Суп-пюре', text='Тыквенный',
+            image='recipe_images/recipe.png', cooking_time=10,
+        )
+        for search in ('суп', 'СУП', 'тыКВ'):
+            with self.subTest(search=search):
+                response = APIClient().get('/api/recipes/',
+                                           {'search': search})
+                self.assertEqual(
+                    [recipe['name'] for recipe in response.data['results']],
+                    ['Суп-пюре'],
+                )
+
+
+class RecipeListCountTest(TestCase):
+    """Количество рецептов в списке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='fan@foodgram.ru', username='fan',
+            first_name='Fan', last_name='Fan', password='pass',
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {n}', text='Описание',
+                   image='recipe_images/recipe.png', cooking_time=10)
+            for n in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_filter_count_follows_toggles(self):
+        url = '/api/recipes/'
+        params = {'is_favorited': 1, 'limit': 1}
+        self.client.post(f'/api/recipes/{self.recipes[0].id}/favorite/')
+        self.assertEqual(self.client.get(url, params).data['count'], 1)
+
+        for recipe in self.recipes[1:]:
+            self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        response = self.client.get(url, params)
+        self.assertEqual(response.data['count'], 3)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(
+            self.client.get(url, {**params, 'page': 2}).status_code, 200
+        )
+
+    def add_recipe(self):
+        # Без сигналов: количество в кэше остаётся прежним
+        Recipe.objects.bulk_create([Recipe(
+            author=self.user, name='Новый рецепт', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10,
+        )])
+
+    def test_stale_count_does_not_hide_pages(self):
+        url = '/api/recipes/'
+        params = {'author': self.user.id, 'limit': 1}
+        self.assertEqual(self.client.get(url, params).data['count'], 3)
+
+        self.add_recipe()
+        response = self.client.get(url, {**params, 'page': 3})
+        self.assertEqual(response.data['count'], 3)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(url, {**params, 'page': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(url, {**params, 'page': 5})
+        self.assertEqual(response.status_code, 404)
+
+    def test_recipe_changes_reset_count(self):
+        url = '/api/recipes/'
+        params = {'author': self.user.id, 'limit': 1}
+        self.assertEqual(self.client.get(url, params).data['count'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                author=self.user, name='Новый рецепт', text='Описание',
+                image='recipe_images/recipe.png', cooking_time=10,
+            )
+        self.assertEqual(self.client.get(url, params).data['count'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+        self.assertEqual(self.client.get(url, params).data['count'], 3)
+
+
+class RecipeTagFilterTest(TestCase):
+    """Фильтр рецептов по тегам `?tags=`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='chef@foodgram.ru', username='chef',
+            first_name='Chef', last_name='Chef', password='pass',
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Омлет', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tag_added_in_other_process(self):
+        client = APIClient()
+        self.assertEqual(
+            client.get('/api/recipes/', {'tags': 'breakfast'}).status_code,
+            400,
+        )
+        # bulk_create не отправляет сигналы, как и изменение тегов
+        # в другом процессе: словарь в кэше остаётся прежним
+        tag, = Tag.objects.bulk_create(
+            [Tag(name='Завтрак', color='#FFFFFF', slug='breakfast')]
+        )
+        self.recipe.tags.add(tag)
+
+        response = client.get('/api/recipes/', {'tags': 'breakfast'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+
+class LinkToggleTest(TransactionTestCase):
+    """Добавление и удаление связей вместе со счётчиками.
+
+    `TransactionTestCase`: отложенная проверка внешних ключей
+    срабатывает только при настоящей фиксации транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='linker@foodgram.ru', username='linker',
+            first_name='Linker', last_name='Linker', password='pass',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Каша', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_missing_recipe(self):
+        response = self.client.post('/api/recipes/0/favorite/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_counter_failure_rolls_back_link(self):
+        with patch('recipes.signals.change_counter',
+                   side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertFalse(Favorite.objects.exists())
+
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_subscribe_to_self(self):
+        for user_id in (self.user.id, f'0{self.user.id}'):
+            with self.subTest(user_id=user_id):
+                response = self.client.post(
+                    f'/api/users/{user_id}/subscribe/'
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+class IngredientIndexTest(TestCase):
+    """Индекс ингредиентов перезагружается по версии в общем кэше."""
+
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+
+    def test_invalidate_from_other_process(self):
+        self.assertEqual(
+            [ing.name for ing in ingredient_index.search('са')], ['Сахар']
+        )
+        # Загрузка без сигналов, как `load_ingrs` в отдельном процессе
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Сало', measurement_unit='г')]
+        )
+        self.assertEqual(len(ingredient_index.search('са')), 1)
+
+        ingredient_index.invalidate()
+        self.assertEqual(
+            [ing.name for ing in ingredient_index.search('са')],
+            ['Сало', 'Сахар'],
+        )
+
+
+class BulkLinksTest(TestCase):
+    """Массовое добавление и удаление в избранное и список покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='bulk@foodgram.ru', username='bulk',
+            first_name='Bulk', last_name='Bulk', password='pass',
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {n}', text='Описание',
+                   image='recipe_images/recipe.png', cooking_time=10)
+            for n in range(3)
+        )
+        cls.missing_id = cls.recipes[-1].id + 100
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, method, link, ids):
+        return getattr(self.client, method)(
+            f'/api/recipes/{link}/bulk/', {'recipes': ids}, format='json'
+        )
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.data]
+
+    def counters(self, field):
+        return list(Recipe.objects.filter(
+            pk__in=[recipe.id for recipe in self.recipes]
+        ).order_by('pk').values_list(field, flat=True))
+
+    def test_add(self):
+        first, second, _ = self.recipes
+        self.client.post(f'/api/recipes/{first.id}/favorite/')
+        response = self.bulk(
+            'post', 'favorite', [first.id, second.id, self.missing_id]
+        )
+        self.assertEqual(self.statuses(response),
+                         ['exists', 'added', 'not_found'])
+        self.assertEqual(self.counters('favorites_count'), [1, 1, 0])
+
+    def test_remove(self):
+        first, second, _ = self.recipes
+        self.bulk('post', 'favorite', [first.id])
+        response = self.bulk(
+            'delete', 'favorite', [first.id, second.id, self.missing_id]
+        )
+        self.assertEqual(self.statuses(response),
+                         ['removed', 'absent', 'not_found'])
+        self.assertEqual(self.counters('favorites_count'), [0, 0, 0])
+
+    @override_settings(BULK_LINKS_MAX=2)
+    def test_limit(self):
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.bulk('post', 'favorite', ids)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipes', response.data)
+        self.assertEqual(
+            self.statuses(self.bulk('post', 'favorite', ids[:2])),
+            ['added', 'added'],
+        )
+
+    def test_cart_cache_reset(self):
+        version, _ = get_cached_cart(self.user.id)
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.bulk('post', 'shopping_cart', ids)
+        self.assertEqual(self.statuses(response), ['added'] * 3)
+        self.assertEqual(self.counters('shopping_carts_count'), [1, 1, 1])
+        changed, _ = get_cached_cart(self.user.id)
+        self.assertNotEqual(changed, version)
+
+        self.bulk('delete', 'shopping_cart', ids[:1])
+        self.assertNotEqual(get_cached_cart(self.user.id)[0], changed)
+        self.assertEqual(self.counters('shopping_carts_count'), [0, 1, 1])
+
+
+class TokenCacheTest(TestCase):
+    """Кэш токенов сбрасывается сразу при logout, смене пароля
+    и деактивации, недействительный токен в кэш не попадает."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='holder@foodgram.ru', username='holder',
+            first_name='Holder', last_name='Holder', password='old-pass-1',
+        )
+
+    def setUp(self):
+        caches[TOKEN_CACHE_ALIAS].clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertTrue(self.is_cached(self.token.key))
+
+    def is_cached(self, key):
+        return caches[TOKEN_CACHE_ALIAS].get(token_cache_key(key)) is not None
+
+    def test_cached_token_skips_database(self):
+        # Единственный запрос - сам список тегов
+        with self.assertNumQueries(1):
+            self.client.get('/api/tags/')
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.is_cached(self.token.key))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_password_change(self):
+        response = self.client.post(
+            '/api/users/set_password/',
+            {'current_password': 'old-pass-1', 'new_password': 'new-pass-2'},
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.is_cached(self.token.key))
+
+        self.client.get('/api/users/me/')
+        token = caches[TOKEN_CACHE_ALIAS].get(token_cache_key(self.token.key))
+        self.assertTrue(token.user.check_password('new-pass-2'))
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.is_cached(self.token.key))
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_bad_token_not_cached(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token bad-token')
+        for _ in range(2):
+            self.assertEqual(client.get('/api/users/me/').status_code, 401)
+            self.assertFalse(self.is_cached('bad-token'))
+
+
+@skipUnless(REPLICA_DATABASE in settings.DATABASES,
+            'Реплика не настроена (DB_REPLICA_NAME)')
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение с реплики и закрепление клиента за основной базой.
+
+    Запуск с двумя файлами SQLite: `DB_ENGINE=django.db.backends.sqlite3
+    DB_NAME=db.sqlite3 DB_REPLICA_NAME=replica.sqlite3 python manage.py
+    test api.tests.ReplicaRoutingTest` (остальные тесты рассчитаны
+    на одну базу). В тестах реплика - зеркало основной базы
+    (`TEST MIRROR`), база, в которую ушёл запрос, определяется
+    по соединению. `TransactionTestCase`: соединение реплики видит
+    только зафиксированные данные.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        caches[TOKEN_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(
+            email='replica@foodgram.ru', username='replica',
+            first_name='Replica', last_name='Replica', password='pass',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Каша', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10,
+        )
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get(self, path, client=None):
+        """Выполняет GET и возвращает запросы к основной базе и реплике."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(
+                connections[REPLICA_DATABASE]
+            ) as replica:
+                response = (client or self.client).get(path)
+        self.assertLess(response.status_code, 400)
+        return primary, replica
+
+    def test_safe_method_reads_replica(self):
+        primary, replica = self.get('/api/tags/', APIClient())
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+
+    def test_write_moves_request_to_primary(self):
+        # GET этого действия пишет в базу, ответ читается уже из основной
+        _, replica = self.get(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(Favorite.objects.filter(user=self.user).exists())
+
+    @override_settings(REPLICA_PIN_SECONDS=1)
+    def test_pin_expires(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        _, replica = self.get('/api/recipes/')
+        self.assertEqual(len(replica), 0)
+        _, replica = self.get('/api/recipes/', APIClient())
+        self.assertGreater(len(replica), 0)
+
+        sleep(1.1)
+        _, replica = self.get('/api/recipes/')
+        self.assertGreater(len(replica), 0)
+
+    def test_tokens_and_sessions_read_primary(self):
+        state = routing_state.set(RoutingState(use_replica=True))
+        try:
+            self.assertEqual(router.db_for_read(Recipe), REPLICA_DATABASE)
+            for model in (Token, Session):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(router.db_for_read(model),
+                                     DEFAULT_DB_ALIAS)
+        finally:
+            routing_state.reset(state)
+
+        primary, _ = self.get('/api/tags/')
+        self.assertIn('authtoken_token', primary[0]['sql'])
+
+    def test_cached_data_reads_primary(self):
+        AmountIngredient.objects.create(
+            recipe=self.recipe, amount=100,
+            ingredients=Ingredient.objects.create(name='Крупа',
+                                                  measurement_unit='г'),
+        )
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        cache.clear()
+        primary, replica = self.get('/api/recipes/download_shopping_cart/')
+        self.assertTrue(any(
+            'recipes_amountingredient' in query['sql'] for query in primary
+        ))
+        self.assertFalse(any(
+            'recipes_amountingredient' in query['sql'] for query in replica
+        ))
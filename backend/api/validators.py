@@ -1,5 +1,6 @@
 """Модуль валидации
 """
+from itertools import chain
 from string import hexdigits
 
 from rest_framework.serializers import ValidationError
@@ -30,9 +31,39 @@ def hex_color_validate(value):
         )
 
 
-def search_duplications(array, key, value):
-    verbose_data = sum(map(list, map(dict.items, array)), [])
-    return (key, value) in verbose_data
+def unique_validate(ingredients, tags):
+    """Проверяет, что ингредиенты и теги рецепта не повторяются.
+
+    Все значения проверяются за один проход по множеству уже
+    встреченных, поэтому время проверки линейно от размера запроса.
+
+    Args:
+        ingredients (list[dict]):
+            Ингредиенты рецепта, каждый с ключом `id`.
+        tags (list):
+            id тегов рецепта.
+
+    Raises:
+        ValidationError:
+            Перечислены повторяющиеся ингредиенты и теги.
+    """
+    seen = set()
+    duplicates = {}
+    for field, value in chain(
+        (('ingredients', ingredient['id']) for ingredient in ingredients),
+        (('tags', tag) for tag in tags),
+    ):
+        if (field, value) in seen:
+            duplicates.setdefault(field, []).append(value)
+        seen.add((field, value))
+
+    if duplicates:
+        raise ValidationError(
+            'Поля не должны повторяться! ' + '; '.join(
+                f'{field}: {", ".join(map(str, values))}'
+                for field, values in duplicates.items()
+            )
+        )
 
 
 # Словарь для сопостановления латинской и русской стандартных раскладок.
@@ -1,40 +1,162 @@
-from django.http import HttpResponse
+from django.db import IntegrityError
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
+from rest_framework.serializers import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
+                                   HTTP_400_BAD_REQUEST)
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from api.filters import IngredientSearchFilter, RecipeAndCartFilter
-from api.manager.conf import ACTION_METHODS, ADD_METHODS, DEL_METHODS
-from api.manager.order_cart import download_cart
-from api.paginators import PageLimitPagination
+from api.manager.conf import (ACTION_METHODS, ADD_METHODS, DEL_METHODS,
+                              LINK_ABSENT, LINK_ADDED, LINK_EXISTS,
+                              LINK_NOT_FOUND, LINK_REMOVED)
+from api.manager.links import add_link, add_links, remove_link, remove_links
+from api.manager.order_cart import download_cart, invalidate_cart
+from api.paginators import (CachedCountPagination, CursorPaginationMixin,
+                            IdCursorLimitPagination, PageLimitPagination)
 from api.permissions import AuthorStaffOrReadOnly
+from api.renderers import CSVRenderer, PlainTextRenderer
 from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             OrderCartSerializer, RecipeReadSerializer,
-                             RecipeSerializer, ShortRecipeSerializer,
-                             TagSerializer, UserSubscribeSerializer)
-from recipes.models import Ingredient, Recipe, Tag
-from users.models import User
+                             OrderCartSerializer, RecipeIdsSerializer,
+                             RecipeReadSerializer, RecipeSerializer,
+                             ShortRecipeSerializer, TagSerializer,
+                             UserSubscribeSerializer, UserViewSerializer)
+from recipes.models import Favorite, Ingredient, OrderCart, Recipe, Tag
 
 
-class UserViewSet(DjoserUserViewSet):
+def link_error(message):
+    return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+def parse_id(value):
+    """Переводит id из url в число, `01` и `1` - один и тот же объект.
+
+    Raises:
+        Http404: id - не число.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404
+
+
+def toggle_link(request, serializer_class, target_field, target_id):
+    """Добавляет или удаляет связь пользователя с объектом.
+
+    Связь пишется одним запросом (`api.manager.links`) в одной
+    транзакции со счётчиками: повтор и отсутствующий объект определяет
+    сама база, объект читается только для ответа или для выбора
+    между 404 и 400.
+
+    Args:
+        request (Request): Запрос пользователя.
+        serializer_class (Serializer): Сериализатор связи с
+            `default_error_messages` (`exists`, `not_found`).
+        target_field (str): Поле связи с объектом (`recipe`, `author`).
+        target_id (str): id объекта из url.
+
+    Raises:
+        Http404: Объект не найден.
+        ValidationError: Связь уже есть или её нет при удалении.
+
+    Returns:
+        dict | None: Представление новой связи или None при удалении.
+    """
+    model = serializer_class.Meta.model
+    target_model = model._meta.get_field(target_field).related_model
+    messages = serializer_class.default_error_messages
+    target_id = parse_id(target_id)
+    values = {'user_id': request.user.id, f'{target_field}_id': target_id}
+
+    if request.method in DEL_METHODS:
+        if remove_link(model, **values) is None:
+            get_object_or_404(target_model, pk=target_id)
+            raise link_error(messages['not_found'])
+        return None
+
+    try:
+        link = add_link(model, **values)
+    except IntegrityError:
+        get_object_or_404(target_model, pk=target_id)
+        raise
+    if link is None:
+        raise link_error(messages['exists'])
+    setattr(link, target_field, get_object_or_404(target_model, pk=target_id))
+    return serializer_class(link, context={'request': request}).data
+
+
+def bulk_toggle_links(request, model):
+    """Добавляет или удаляет связи пользователя с несколькими рецептами.
+
+    Набор связей меняется одним запросом (`add_links`/`remove_links`),
+    отсутствующие рецепты определяются ещё одним запросом.
+
+    Args:
+        request (Request): Запрос со списком `recipes`.
+        model (Model): Модель связи - `Favorite` или `OrderCart`.
+
+    Returns:
+        list[dict]: Результат для каждого рецепта - `id` и `status`.
+    """
+    serializer = RecipeIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = serializer.validated_data['recipes']
+
+    if request.method in DEL_METHODS:
+        done = remove_links(model, 'recipe', ids, user_id=request.user.id)
+        status, other = LINK_REMOVED, LINK_ABSENT
+        missing = set(ids) - done
+        if missing:
+            missing -= set(Recipe.objects.filter(
+                pk__in=missing
+            ).order_by().values_list('pk', flat=True))
+    else:
+        missing = set(ids) - set(Recipe.objects.filter(
+            pk__in=ids
+        ).order_by().values_list('pk', flat=True))
+        done = add_links(model, 'recipe', ids, user_id=request.user.id)
+        status, other = LINK_ADDED, LINK_EXISTS
+
+    return [
+        {
+            'id': recipe_id,
+            'status': (
+                status if recipe_id in done
+                else LINK_NOT_FOUND if recipe_id in missing
+                else other
+            ),
+        }
+        for recipe_id in ids
+    ]
+
+
+class UserViewSet(CursorPaginationMixin, DjoserUserViewSet):
     """Работает с пользователями.
 
     ViewSet для работы с пользователями - вывод таковых,
     регистрация.
     Для авторизованных пользователей —
     возможность подписаться на автора рецепта.
+    С параметром `?pagination=cursor` списки выводятся
+    курсорной пагинацией.
     """
     pagination_class = PageLimitPagination
+    cursor_pagination_class = IdCursorLimitPagination
     permission_classes = (AuthorStaffOrReadOnly,)
     add_serializer = UserSubscribeSerializer
 
     @action(
         methods=ACTION_METHODS,
         detail=True,
+        permission_classes=(IsAuthenticated,),
     )
     def subscribe(self, request, id):
         """Создаёт/удалит связь между пользователями.
@@ -50,41 +172,33 @@ class UserViewSet(DjoserUserViewSet):
         Returns:
             Response: Статус подтверждающий/отклоняющий действие.
         """
-        user = request.user
-        author = get_object_or_404(User, pk=id)
-
-        serializer = self.add_serializer(
-            data={'user': user.id, 'author': author.id},
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-
-        if request.method in ADD_METHODS:
-            result = serializer.save()
-
-            serializer = self.add_serializer(
-                result, context={'request': request}
+        if request.method in ADD_METHODS and request.user.id == parse_id(id):
+            raise link_error(
+                self.add_serializer.default_error_messages['self']
             )
 
-            return Response(serializer.data, status=HTTP_201_CREATED)
-
-        if request.method in DEL_METHODS:
-            user.subscriber.filter(author_id=author.id).delete()
-
-            return Response('Подписка успешно удалена',
-                            status=HTTP_204_NO_CONTENT)
+        data = toggle_link(request, self.add_serializer, 'author', id)
+        if data is not None:
+            return Response(data, status=HTTP_201_CREATED)
+        return Response('Подписка успешно удалена',
+                        status=HTTP_204_NO_CONTENT)
 
     @action(
         methods=('get',),
         detail=False,
+        permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
         """Список подписок пользоваетеля.
 
         Вызов метода через url: */user/<int:id>/subscriptions/.
+        Страница выбирается за постоянное число запросов: подписки
+        с авторами (количество рецептов хранится в счётчике автора),
+        затем первые `recipes_limit` рецептов всех авторов страницы
+        одним запросом.
 
         Args:
-            request (Request): Не используется.
+            request (Request): Запрос с параметром `recipes_limit`.
 
         Returns:
             Response:
@@ -92,7 +206,15 @@ class UserViewSet(DjoserUserViewSet):
                 Список подписок для авторизованного пользователя.
         """
         user = self.request.user
-        authors = user.subscriber.all()
+        recipes = Recipe.objects.all()
+        recipes_limit = UserViewSerializer.get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+
+        authors = user.subscriber.select_related('author').prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='recipes_preview')
+        )
         pages = self.paginate_queryset(authors)
         serializer = self.add_serializer(
             pages, many=True, context={'request': request}
@@ -118,7 +240,7 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     search_fields = ('^name',)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(CursorPaginationMixin, ModelViewSet):
     """Работает с рецептами.
 
     Вывод, создание, редактирование, добавление/удаление
@@ -127,13 +249,37 @@ class RecipeViewSet(ModelViewSet):
     Для авторизованных пользователей — возможность добавить
     рецепт в избранное и в список покупок.
     Изменять рецепт может только автор или админы.
+    С параметром `?pagination=cursor` список выводится
+    курсорной пагинацией.
     """
     queryset = Recipe.objects.select_related('author')
     permission_classes = (AuthorStaffOrReadOnly,)
     filterset_class = RecipeAndCartFilter
-    pagination_class = PageLimitPagination
+    pagination_class = CachedCountPagination
     add_serializer = ShortRecipeSerializer
 
+    def get_queryset(self):
+        """Возвращает рецепты, подготовленные под текущее действие.
+
+        Для `list` и `retrieve` связи подгружаются заранее,
+        поэтому число запросов не зависит от размера страницы.
+        Флаги пользователя аннотируются для всех действий.
+
+        Returns:
+            QuerySet: Рецепты с аннотированными флагами.
+        """
+        user = self.request.user
+
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_read(user)
+
+        return self.queryset.with_user_flags(user)
+
+    def perform_destroy(self, instance):
+        users = list(instance.shoppingcart.values_list('user_id', flat=True))
+        instance.delete()
+        invalidate_cart(*users)
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeReadSerializer
@@ -144,6 +290,7 @@ class RecipeViewSet(ModelViewSet):
         detail=True,
         url_path='favorite',
         url_name='favorite',
+        permission_classes=(IsAuthenticated,),
     )
     def favorite(self, request, pk):
         """Добавляет/удалет рецепт в `избранное`.
@@ -159,32 +306,18 @@ class RecipeViewSet(ModelViewSet):
         Returns:
             Response: Статус подтверждающий/отклоняющий действие.
         """
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-
-        serializer = FavoriteSerializer(
-            data={'user': request.user.id, 'recipe': recipe.id},
-            context={'request': request})
-
-        serializer.is_valid(raise_exception=True)
-
-        if request.method in ADD_METHODS:
-            serializer.save()
-
-            return Response(serializer.data,
-                            status=HTTP_201_CREATED)
-
-        if request.method in DEL_METHODS:
-            user.favorites.filter(recipe_id=recipe.id).delete()
-
-            return Response('Удалено из избранного',
-                            status=HTTP_204_NO_CONTENT)
+        data = toggle_link(request, FavoriteSerializer, 'recipe', pk)
+        if data is not None:
+            return Response(data, status=HTTP_201_CREATED)
+        return Response('Удалено из избранного',
+                        status=HTTP_204_NO_CONTENT)
 
     @action(
         methods=ACTION_METHODS,
         detail=True,
         url_path='shopping_cart',
         url_name='shopping_cart',
+        permission_classes=(IsAuthenticated,),
     )
     def shopping_cart(self, request, pk):
         """Добавляет/удалет рецепт в `список покупок`.
@@ -200,52 +333,97 @@ class RecipeViewSet(ModelViewSet):
             Response: Статус подтверждающий/отклоняющий действие.
         """
 
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
+        data = toggle_link(request, OrderCartSerializer, 'recipe', pk)
+        invalidate_cart(request.user.id)
+        if data is not None:
+            return Response(data, status=HTTP_201_CREATED)
+        return Response('Удалено из корзины',
+                        status=HTTP_204_NO_CONTENT)
 
-        serializer = OrderCartSerializer(
-            data={'user': request.user.id, 'recipe': recipe.id},
-            context={'request': request})
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='favorite/bulk',
+        url_name='favorite_bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        """Добавляет/удаляет в `избранном` сразу несколько рецептов.
 
-        serializer.is_valid(raise_exception=True)
+        Вызов метода через url: */recipe/favorite/bulk/
+        с телом `{"recipes": [1, 2, 3]}` (не больше `settings.BULK_LINKS_MAX`).
 
-        if request.method in ADD_METHODS:
-            serializer.save()
+        Args:
+            request (Request): Запрос со списком id рецептов.
 
-            return Response(serializer.data,
-                            status=HTTP_201_CREATED)
+        Returns:
+            Response: Результат для каждого рецепта: added/exists
+            или removed/absent, not_found - рецепта нет.
+        """
+        return Response(bulk_toggle_links(request, Favorite))
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='shopping_cart/bulk',
+        url_name='shopping_cart_bulk',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавляет/удаляет в `списке покупок` сразу несколько рецептов.
+
+        Вызов метода через url: */recipe/shopping_cart/bulk/
+        с телом `{"recipes": [1, 2, 3]}` (не больше `settings.BULK_LINKS_MAX`).
 
-        if request.method in DEL_METHODS:
-            user.shoppingcart.filter(recipe_id=recipe.id).delete()
+        Args:
+            request (Request): Запрос со списком id рецептов.
 
-            return Response('Удалено из корзины',
-                            status=HTTP_204_NO_CONTENT)
+        Returns:
+            Response: Результат для каждого рецепта: added/exists
+            или removed/absent, not_found - рецепта нет.
+        """
+        results = bulk_toggle_links(request, OrderCart)
+        invalidate_cart(request.user.id)
+        return Response(results)
 
     @action(
         methods=('get',),
         detail=False,
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer),
     )
     def download_shopping_cart(self, request):
-        """Загружает файл *.txt со списком покупок.
+        """Загружает файл со списком покупок.
 
         Считает сумму ингредиентов в рецептах выбранных для покупки.
-        Возвращает текстовый файл со списком ингредиентов.
-        Вызов метода через url:  */recipe/<int:id>/download_shopping_cart/.
+        Возвращает файл со списком ингредиентов потоком.
+        Формат выбирается параметром `?format=txt|csv|json`
+        (по умолчанию - `txt`).
+        Посчитанный список хранится в кэше: повторная выгрузка - одно
+        чтение из кэша, без запросов к базе.
+        Вызов метода через url:  */recipe/download_shopping_cart/.
 
         Args:
-            request (Request): Не используется.
+            request (Request): Запрос содержащий данные сессии.
 
         Returns:
-            Response: Ответ с текстовым файлом.
+            StreamingHttpResponse: Ответ с файлом.
         """
-        shopping_list = download_cart(self.request.user)
+        user = request.user
+        renderer = request.accepted_renderer
+
+        content = download_cart(user, renderer.format)
+        if content is None:
+            return Response('Список покупок пуст',
+                            status=HTTP_400_BAD_REQUEST)
 
-        filename = f'{self.request.user.username}_shopping_list.txt'
+        filename = f'{user.username}_shopping_list.{renderer.format}'
 
-        response = HttpResponse(
-            shopping_list, content_type='text.txt; charset=utf-8'
+        response = StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset=utf-8'
         )
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
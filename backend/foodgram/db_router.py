@@ -0,0 +1,108 @@
+"""Маршрутизация запросов к базе между основной базой и репликой.
+
+Подключается в настройках, только если задана реплика
+(`DB_REPLICA_HOST` или `DB_REPLICA_NAME`).
+
+`ReplicaRoutingMiddleware` разрешает чтение с реплики для безопасных
+HTTP-методов. Как только в запросе происходит запись, дальнейшие
+чтения идут в основную базу, а клиент (по токену или сессии)
+на `REPLICA_PIN_SECONDS` закрепляется за основной базой, чтобы сразу
+увидеть свои изменения. Закрепление хранится в кэше `default`, общем для
+всех процессов (`CACHE_LOCATION`), поэтому следующий запрос клиента
+видит его в любом воркере. Вне запросов (команды, обработчики очередей)
+всё читается из основной базы.
+
+Данные, которые кладутся в кэш под текущей версией (список покупок,
+индекс ингредиентов, словарь тегов, количество рецептов), читаются
+явно из основной базы (`using(DEFAULT_DB_ALIAS)`): отстающая реплика
+иначе положила бы в кэш устаревшие данные под новой версией.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DATABASE = 'replica'
+
+# Модели, которые всегда читаются из основной базы: новый токен или
+# сессия могут ещё не дойти до реплики
+PRIMARY_ONLY_MODELS = ('authtoken.token', 'sessions.session')
+
+PIN_CACHE_PREFIX = 'db_primary_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+@dataclass
+class RoutingState:
+    use_replica: bool
+    wrote: bool = False
+
+
+routing_state = ContextVar('db_routing_state', default=None)
+
+
+class ReplicaRouter:
+    """Чтение - с реплики, если это разрешено для текущего запроса,
+    запись и миграции - только в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if (
+            state is not None and state.use_replica and not state.wrote
+            and model._meta.label_lower not in PRIMARY_ONLY_MODELS
+        ):
+            return REPLICA_DATABASE
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_cache_key(request):
+    """Ключ закрепления клиента за основной базой.
+
+    Клиент определяется по заголовку Authorization или cookie сессии,
+    анонимные запросы без них не закрепляются.
+    """
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return f'{PIN_CACHE_PREFIX}:{sha256(credentials.encode()).hexdigest()}'
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает базу для чтения на время запроса (см. `ReplicaRouter`)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = pin_cache_key(request)
+        state = RoutingState(
+            use_replica=request.method in SAFE_METHODS
+            and not (key and cache.get(key))
+        )
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if state.wrote and key:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 
 from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
 
 REVIEW = 0
 
@@ -78,9 +79,24 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # Соединение живёт между запросами столько секунд (0 - закрывать
+        # после каждого запроса), перед повторным использованием
+        # проверяется (CONN_HEALTH_CHECKS)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True,
+                                     cast=bool),
+        # Для pgbouncer в режиме pool_mode=transaction серверные курсоры
+        # нужно отключить
+        'DISABLE_SERVER_SIDE_CURSORS': config(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool
+        ),
     }
 }
+if 'postgresql' in (DATABASES['default']['ENGINE'] or ''):
+    DATABASES['default']['OPTIONS'] = {
+        'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+    }
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -95,9 +111,49 @@ AUTH_PASSWORD_VALIDATORS = [
         'django.contrib.auth.password_validation.NumericPasswordValidator', },
 ]
 
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+REDIS_CACHE = 'django.core.cache.backends.redis.RedisCache'
+
+# Общий кэш всех процессов (воркеры gunicorn, image_worker, команды
+# manage.py), например redis://redis:6379/0. Версии списков покупок,
+# индекса ингредиентов и тегов, токены и закрепление клиента за основной
+# базой сбрасываются в одном процессе и должны сразу стать видны
+# остальным. LocMemCache у каждого процесса свой, без CACHE_LOCATION
+# он используется только при DEBUG (один процесс, тесты)
+CACHE_LOCATION = config('CACHE_LOCATION', default='')
+CACHE_BACKEND = config(
+    'CACHE_BACKEND', default=REDIS_CACHE if CACHE_LOCATION else LOCMEM_CACHE
+)
+TOKEN_CACHE_BACKEND = config('TOKEN_CACHE_BACKEND', default=CACHE_BACKEND)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    'tokens': {
+        'BACKEND': TOKEN_CACHE_BACKEND,
+        'LOCATION': config('TOKEN_CACHE_LOCATION',
+                           default=CACHE_LOCATION or 'tokens'),
+        'KEY_PREFIX': 'tokens',
+        'TIMEOUT': config('TOKEN_CACHE_TIMEOUT', default=5 * 60, cast=int),
+    },
+}
+if TOKEN_CACHE_BACKEND == LOCMEM_CACHE:
+    CACHES['tokens']['OPTIONS'] = {
+        'MAX_ENTRIES': config('TOKEN_CACHE_MAX_ENTRIES', default=10_000,
+                              cast=int),
+    }
+
+if not DEBUG and LOCMEM_CACHE in (CACHE_BACKEND, TOKEN_CACHE_BACKEND):
+    raise ImproperlyConfigured(
+        'При DEBUG=False нужен общий для всех процессов кэш: '
+        'задайте CACHE_LOCATION (например, redis://redis:6379/0).'
+    )
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':
-        ['rest_framework.authentication.TokenAuthentication', ],
+        ['api.authentication.CachedTokenAuthentication', ],
 
     'DEFAULT_PERMISSION_CLASSES':
         ['rest_framework.permissions.IsAuthenticatedOrReadOnly', ],
@@ -106,6 +162,10 @@ REST_FRAMEWORK = {
         ['django_filters.rest_framework.DjangoFilterBackend', ],
 }
 
+# Максимальное количество рецептов в одном массовом добавлении/удалении
+# в избранное и список покупок
+BULK_LINKS_MAX = config('BULK_LINKS_MAX', default=100, cast=int)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -146,3 +206,27 @@ if REVIEW:
             'NAME': str(BASE_DIR / 'db.sqlite3'),
         }
     }
+
+# Реплика для чтения (необязательно). Параметры, которые не заданы,
+# берутся из основной базы
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+
+# Сколько секунд после записи клиент читает из основной базы
+REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=5, cast=int)
+
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DB_REPLICA_HOST or DATABASES['default'].get('HOST'),
+        'PORT': config('DB_REPLICA_PORT',
+                       default=DATABASES['default'].get('PORT')),
+        'USER': config('DB_REPLICA_USER',
+                       default=DATABASES['default'].get('USER')),
+        'PASSWORD': config('DB_REPLICA_PASSWORD',
+                           default=DATABASES['default'].get('PASSWORD')),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+    MIDDLEWARE.insert(1, 'foodgram.db_router.ReplicaRoutingMiddleware')
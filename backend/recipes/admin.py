@@ -2,8 +2,9 @@ from django.contrib.admin import (ModelAdmin, TabularInline, action, register,
                                   site)
 from django.utils.safestring import mark_safe
 
-from recipes.models import (AmountIngredient, Favorite, Ingredient, OrderCart,
-                            Recipe, Tag)
+from recipes.manager.images import enqueue_recipe_image
+from recipes.models import (AmountIngredient, Favorite, ImageTask, Ingredient,
+                            OrderCart, Recipe, Tag)
 
 site.site_header = 'Администрирование Foodgram'
 EMPTY_VALUE_DISPLAY = 'Значение не указано'
@@ -51,7 +52,9 @@ class RecipeAdmin(ModelAdmin):
     list_display = (
         'name',
         'author',
+        'favorites_count',
         'get_image',
+        'image_status',
     )
     fields = (
         ('name', 'cooking_time',),
@@ -72,8 +75,19 @@ class RecipeAdmin(ModelAdmin):
     empty_value_display = EMPTY_VALUE_DISPLAY
     actions = [duplicate_event]
 
+    def save_model(self, request, obj, form, change):
+        """Сохраняет рецепт, новое изображение ставит в очередь.
+
+        Поля изображения обычный `save()` не записывает
+        (`Recipe.MANAGED_FIELDS`).
+        """
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            enqueue_recipe_image(obj)
+
     def get_image(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="80" height="30">')
+        image = obj.image_thumb or obj.image
+        return mark_safe(f'<img src={image.url} width="80" height="30">')
 
     get_image.short_description = 'Изображение'
 
@@ -103,3 +117,11 @@ class FavoriteAdmin(ModelAdmin):
     list_fields = (
         'user', 'recipe',
     )
+
+
+@register(ImageTask)
+class ImageTaskAdmin(ModelAdmin):
+    list_display = (
+        'recipe', 'source', 'created', 'started', 'attempts',
+    )
+    raw_id_fields = ('recipe',)
@@ -0,0 +1,89 @@
+from statistics import mean, median
+from time import perf_counter
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Замер времени запроса к API с закрытием соединения с базой '
+            'после каждого запроса (CONN_MAX_AGE=0) и с повторным '
+            'использованием соединения (CONN_MAX_AGE из настроек). '
+            'Запросы проходят через WSGIHandler, как в gunicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tags/',
+                            help='Адрес запроса')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Количество запросов в каждом режиме')
+        parser.add_argument('--conn-max-age', type=int, default=60,
+                            help='CONN_MAX_AGE в режиме повторного '
+                                 'использования')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Алиас базы данных')
+
+    def run(self, handler, path, count):
+        """Выполняет запросы и возвращает время каждого (секунды)."""
+        timings = []
+        for _ in range(count):
+            environ = RequestFactory().get(path).environ
+            started = perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            # Закрытие ответа отправляет request_finished, после которого
+            # Django закрывает устаревшие соединения
+            response.close()
+            timings.append(perf_counter() - started)
+        return timings
+
+    def measure_connect(self, connection, count):
+        """Время открытия соединения без запроса к API (секунды)."""
+        timings = []
+        for _ in range(count):
+            connection.close()
+            started = perf_counter()
+            connection.ensure_connection()
+            timings.append(perf_counter() - started)
+        return timings
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        handler = WSGIHandler()
+        count = options['requests']
+        initial = connection.settings_dict['CONN_MAX_AGE']
+        results = {}
+        try:
+            for label, max_age in (
+                ('CONN_MAX_AGE=0', 0),
+                (f'CONN_MAX_AGE={options["conn_max_age"]}',
+                 options['conn_max_age']),
+            ):
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                self.run(handler, options['path'], min(count, 20))
+                results[label] = self.run(handler, options['path'], count)
+            connect = self.measure_connect(connection, min(count, 100))
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = initial
+
+        self.stdout.write(
+            f'{connection.vendor}, {options["path"]}, '
+            f'{count} запросов в каждом режиме'
+        )
+        self.stdout.write(
+            f'{"режим":<18} {"среднее, мс":>12} {"медиана, мс":>12} '
+            f'{"p95, мс":>9}'
+        )
+        for label, timings in results.items():
+            timings.sort()
+            self.stdout.write(
+                f'{label:<18} {mean(timings) * 1e3:>12.3f} '
+                f'{median(timings) * 1e3:>12.3f} '
+                f'{timings[int(len(timings) * 0.95)] * 1e3:>9.3f}'
+            )
+        self.stdout.write(
+            f'Открытие соединения: медиана {median(connect) * 1e3:.3f} мс'
+        )
@@ -0,0 +1,80 @@
+import base64
+from io import BytesIO
+from timeit import Timer
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from api.serializers import RecipeSerializer
+from api.validators import unique_validate
+from recipes.models import Ingredient, Tag
+
+BENCH_PREFIX = 'bench'
+
+
+def png_base64():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), 'white').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class Command(BaseCommand):
+    help = ('Замер проверки рецепта в зависимости от количества '
+            'ингредиентов: `unique_validate` и полная проверка '
+            '`RecipeSerializer`. Данные создаются во временной транзакции '
+            'и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=[10, 100, 1000],
+                            help='Количества ингредиентов в рецепте')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов каждого замера (берётся лучший)')
+
+    def measure(self, func, repeat):
+        timer = Timer(func)
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat, number)) / number
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        image = png_base64()
+        with transaction.atomic():
+            tag = Tag.objects.create(name=BENCH_PREFIX, slug=BENCH_PREFIX,
+                                     color='#FFFFFF')
+            ingredients = Ingredient.objects.bulk_create(
+                Ingredient(name=f'{BENCH_PREFIX} {n}', measurement_unit='г')
+                for n in range(sizes[-1])
+            )
+
+            self.stdout.write(
+                f'{"ингредиентов":>12} {"unique, мкс":>12} '
+                f'{"мкс/шт":>8} {"serializer, мс":>15} {"мкс/шт":>8}'
+            )
+            for size in sizes:
+                data = {
+                    'name': BENCH_PREFIX, 'text': BENCH_PREFIX,
+                    'cooking_time': 10, 'image': image, 'tags': [tag.id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': 10}
+                        for ingredient in ingredients[:size]
+                    ],
+                }
+                unique = self.measure(
+                    lambda: unique_validate(data['ingredients'], [tag.id]),
+                    options['repeat'],
+                )
+                full = self.measure(
+                    lambda: RecipeSerializer(data=data).is_valid(
+                        raise_exception=True
+                    ),
+                    options['repeat'],
+                )
+                self.stdout.write(
+                    f'{size:>12} {unique * 1e6:>12.1f} '
+                    f'{unique * 1e6 / size:>8.3f} '
+                    f'{full * 1e3:>15.2f} {full * 1e6 / size:>8.2f}'
+                )
+            transaction.set_rollback(True)
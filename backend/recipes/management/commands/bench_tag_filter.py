@@ -0,0 +1,91 @@
+from timeit import Timer
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from api.filters import RecipeAndCartFilter
+from api.manager.tag_map import invalidate_tag_map
+from recipes.models import Recipe, Tag
+from users.models import User
+
+BENCH_PREFIX = 'bench'
+
+
+class Command(BaseCommand):
+    help = ('Замер фильтра рецептов по тегам (`?tags=`) в зависимости от '
+            'количества рецептов и тегов. Данные создаются во временной '
+            'транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', nargs='+', type=int,
+                            default=[1000, 4000, 16000],
+                            help='Количества рецептов для замера')
+        parser.add_argument('--tags', nargs='+', type=int,
+                            default=[1, 2, 4, 8],
+                            help='Количества тегов в запросе')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Повторов каждого замера (берётся лучший)')
+
+    def create_recipes(self, author, tags, count, start):
+        """Добавляет рецепты, каждому - теги по кругу (по два на рецепт)."""
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'{BENCH_PREFIX} {n}', text='bench',
+                   image='recipe_images/bench.png')
+            for n in range(start, start + count)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id,
+                                tag_id=tags[(n + shift) % len(tags)].id)
+            for n, recipe in enumerate(recipes, start) for shift in (0, 1)
+        )
+
+    def measure(self, slugs, repeat):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+
+        def run():
+            RecipeAndCartFilter(
+                {'tags': slugs}, queryset=Recipe.objects.all(),
+                request=request,
+            ).qs.count()
+
+        timer = Timer(run)
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat, number)) / number
+
+    def handle(self, *args, **options):
+        max_tags = max(options['tags'])
+        with transaction.atomic():
+            author = User.objects.create(
+                email=f'{BENCH_PREFIX}@foodgram.local',
+                username=f'{BENCH_PREFIX}author',
+            )
+            tags = Tag.objects.bulk_create(
+                Tag(name=f'{BENCH_PREFIX} {n}', color='#FFFFFF',
+                    slug=f'{BENCH_PREFIX}{n}')
+                for n in range(max(max_tags, 2))
+            )
+            invalidate_tag_map()
+
+            self.stdout.write(
+                f'{"рецептов":>10} {"тегов":>6} {"мс":>9} '
+                f'{"мкс/рецепт":>11}'
+            )
+            created = 0
+            for count in sorted(options['recipes']):
+                self.create_recipes(author, tags, count - created, created)
+                created = count
+                for tags_count in options['tags']:
+                    seconds = self.measure(
+                        [tag.slug for tag in tags[:tags_count]],
+                        options['repeat'],
+                    )
+                    self.stdout.write(
+                        f'{count:>10} {tags_count:>6} '
+                        f'{seconds * 1000:>9.2f} '
+                        f'{seconds * 1_000_000 / count:>11.3f}'
+                    )
+            transaction.set_rollback(True)
+        invalidate_tag_map()
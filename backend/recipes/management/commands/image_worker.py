@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes.manager.conf import IMAGE_WORKER_SLEEP
+from recipes.manager.images import claim_task, fail_task, run_task
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выйти, когда очередь опустеет')
+        parser.add_argument('--sleep', default=IMAGE_WORKER_SLEEP,
+                            type=float,
+                            help='Пауза, когда задач нет (секунды)')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            task = claim_task()
+            if task is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            self.run(task)
+
+    def run(self, task):
+        try:
+            done = run_task(task)
+        except Exception as error:
+            failed = fail_task(task)
+            self.stderr.write(
+                f'Рецепт {task.recipe_id}: {error!r}'
+                + (' - попытки исчерпаны' if failed else '')
+            )
+        else:
+            self.stdout.write(
+                f'Рецепт {task.recipe_id}: '
+                + ('готово' if done else 'изображение заменено, пропущено')
+            )
@@ -0,0 +1,64 @@
+import os
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError
+
+from api.manager.conf import TOKEN_CACHE_ALIAS
+from recipes.management.reader.dump_reader import DumpReader
+from recipes.management.reader.file_reader import open_file
+from recipes.manager.conf import IMPORT_BATCH_SIZE, MEDIA_COPY_WORKERS
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+
+class Command(BaseCommand):
+    help = 'Загрузка полного дампа базы и медиафайлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', default='dump.json', nargs='?',
+                            type=str,
+                            help='Дамп dumpdata в формате json, можно .gz')
+        parser.add_argument('--media', default='media', type=str,
+                            help='Каталог медиафайлов дампа внутри data')
+        parser.add_argument('--batch-size', default=IMPORT_BATCH_SIZE,
+                            type=int,
+                            help='Количество записей в одном INSERT')
+        parser.add_argument('--workers', default=MEDIA_COPY_WORKERS,
+                            type=int,
+                            help='Потоков для копирования медиафайлов')
+        parser.add_argument('-e', '--exclude', action='append', default=[],
+                            help='Пропустить приложение или модель '
+                                 '(app_label или app_label.Model)')
+
+    def handle(self, *args, **options):
+        try:
+            with open_file(os.path.join(DATA_ROOT,
+                                        options['filename'])) as file:
+                reader = DumpReader(
+                    file,
+                    media_source=os.path.join(DATA_ROOT, options['media']),
+                    media_target=settings.MEDIA_ROOT,
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    exclude=options['exclude'],
+                    stdout=self.stdout,
+                )
+                reader.read_file()
+        except (DeserializationError, IntegrityError, ValueError) as error:
+            raise CommandError(f'Ошибка в дампе: {error}')
+        except FileNotFoundError:
+            raise CommandError('Добавьте файл дампа в директорию data')
+
+        # bulk_create не отправляет сигналы - счётчики пересчитываются
+        call_command('rebuild_counters', stdout=self.stdout)
+        # Дамп мог перезаписать любые данные (update_conflicts), поэтому
+        # очищаются общие для всех процессов кэши (CACHE_LOCATION):
+        # списки покупок, индекс ингредиентов, теги, количества и токены.
+        # Ключи версий после очистки создаются заново, устаревшие данные
+        # веб-воркеров под ними не окажутся
+        for alias in (DEFAULT_CACHE_ALIAS, TOKEN_CACHE_ALIAS):
+            caches[alias].clear()
@@ -3,7 +3,10 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
-from recipes.management.reader.file_reader import PRODUCT_MANAGER, FileReader
+from api.manager.ingredient_index import ingredient_index
+from recipes.management.reader.file_reader import (PRODUCT_MANAGER, FileReader,
+                                                   open_file)
+from recipes.manager.conf import IMPORT_BATCH_SIZE
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
 
@@ -13,13 +16,22 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.csv', nargs='?',
-                            type=str)
+                            type=str,
+                            help='Файл csv|json|ndjson, можно сжатый (.gz)')
+        parser.add_argument('--batch-size', default=IMPORT_BATCH_SIZE,
+                            type=int,
+                            help='Количество записей в одном INSERT')
 
     def handle(self, *args, **options):
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as file:
-                reader = FileReader(file, PRODUCT_MANAGER)
+            with open_file(os.path.join(DATA_ROOT,
+                                        options['filename'])) as file:
+                reader = FileReader(file, PRODUCT_MANAGER,
+                                    batch_size=options['batch_size'],
+                                    stdout=self.stdout)
                 reader.read_file()
+        except ValueError as error:
+            raise CommandError(f'Ошибка в файле: {error}')
         except FileNotFoundError:
             raise CommandError('Добавьте файл ingredients в директорию data')
+        ingredient_index.invalidate()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.manager.conf import IMAGE_READY
+from recipes.manager.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Обработка изображений рецептов и создание их вариантов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Обработать и рецепты, у которых '
+                                 'варианты уже есть')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only('image')
+        if not options['all']:
+            recipes = recipes.filter(
+                Q(image_card='') | ~Q(image_status=IMAGE_READY)
+            )
+
+        processed = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                process_recipe_image(recipe.pk, recipe.image.name)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+            else:
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, ошибок: {failed}'
+        ))
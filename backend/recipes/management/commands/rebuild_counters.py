@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, OrderCart, Recipe
+from users.models import Subscribe, User
+
+
+def count_related(model, field):
+    """Подзапрос количества записей `model`, ссылающихся на строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков пользователей и рецептов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = User.objects.update(
+                recipes_count=count_related(Recipe, 'author'),
+                subscribers_count=count_related(Subscribe, 'author'),
+            )
+            recipes = Recipe.objects.update(
+                favorites_count=count_related(Favorite, 'recipe'),
+                shopping_carts_count=count_related(OrderCart, 'recipe'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей - {users}, рецептов - {recipes}'
+        ))
@@ -0,0 +1,352 @@
+import filecmp
+import os
+import shutil
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import FileField
+from django.utils._os import safe_join
+
+from recipes.management.reader.file_reader import iter_json_array
+from recipes.manager.conf import (IMPORT_BATCH_SIZE, IMPORT_PROGRESS_EVERY,
+                                  MEDIA_COPY_WORKERS)
+
+MEDIA_COPIED = 'скопировано'
+
+MEDIA_SKIPPED = 'уже были'
+
+MEDIA_MISSING = 'нет в дампе'
+
+MEDIA_CORRUPTED = 'повреждено'
+
+
+def copy_media(name, source_root, target_root):
+    """Копирует медиафайл из дампа и сверяет копию с исходным файлом.
+
+    Args:
+        name (str): Имя файла из поля модели, например
+            `recipe_images/1.jpg`.
+        source_root (str): Каталог медиафайлов дампа.
+        target_root (str): MEDIA_ROOT проекта.
+
+    Returns:
+        str: Итог копирования - одна из констант `MEDIA_*`.
+    """
+    source = safe_join(source_root, name)
+    target = safe_join(target_root, name)
+    if not os.path.isfile(source):
+        return MEDIA_MISSING
+    if os.path.isfile(target) and filecmp.cmp(source, target, shallow=False):
+        return MEDIA_SKIPPED
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(source, target)
+    if not filecmp.cmp(source, target, shallow=False):
+        return MEDIA_CORRUPTED
+    return MEDIA_COPIED
+
+
+def m2m_rows(field, objects):
+    """Строки промежуточной таблицы связи many-to-many.
+
+    Args:
+        field (ManyToManyField): Поле со стандартной промежуточной моделью.
+        objects (list[DeserializedObject]): Объекты из дампа.
+
+    Returns:
+        list[Model]: Несохранённые строки промежуточной модели.
+    """
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+    return [
+        through(**{source: obj.object.pk, target: pk})
+        for obj in objects
+        for pk in obj.m2m_data.get(field.name, ())
+    ]
+
+
+def remap_references(obj, mappings):
+    """Переводит ссылки объекта на записи с новыми pk.
+
+    Args:
+        obj (DeserializedObject): Объект из дампа.
+        mappings (dict): Модель -> словарь `pk в дампе -> pk в базе`.
+    """
+    opts = obj.object._meta
+    for field in opts.concrete_fields:
+        mapping = mappings.get(field.related_model)
+        value = getattr(obj.object, field.attname)
+        if field.is_relation and mapping and value in mapping:
+            setattr(obj.object, field.attname, mapping[value])
+    for field in opts.many_to_many:
+        mapping = mappings.get(field.related_model)
+        if mapping and field.name in obj.m2m_data:
+            obj.m2m_data[field.name] = [
+                mapping.get(pk, pk) for pk in obj.m2m_data[field.name]
+            ]
+
+
+class DumpReader:
+    """Загрузка полного дампа `dumpdata` (JSON) пачками.
+
+    Дамп читается потоком, объекты копятся по моделям и записываются
+    `bulk_create` с обновлением записей с тем же pk, как и `loaddata`.
+    Проверка внешних ключей отложена до конца транзакции, поэтому
+    полные пачки пишутся сразу, а остатки - в порядке зависимостей
+    моделей. Медиафайлы копируются в пуле потоков параллельно с записью
+    в базу. После загрузки сбрасываются последовательности первичных
+    ключей.
+
+    Типы содержимого и права (`NATURAL_KEYS`) `migrate` уже создал,
+    и их pk могут не совпадать с дампом. Такие записи сопоставляются
+    по естественному ключу, недостающие создаются, а ссылки на них
+    в остальных объектах переводятся на pk из базы. Поэтому модели
+    со ссылками на них пишутся в конце загрузки.
+
+    Attributes:
+        file(file):
+            Открытый файл дампа.
+        media_source(str):
+            Каталог медиафайлов дампа.
+        media_target(str):
+            Куда копировать медиафайлы (MEDIA_ROOT).
+        batch_size(int):
+            Количество записей в одном INSERT.
+        workers(int):
+            Количество потоков копирования медиафайлов.
+        exclude(Iterable[str]):
+            Пропускаемые приложения или модели (`app_label[.Model]`).
+        stdout(file):
+            Куда выводить прогресс и итог.
+        using(str):
+            Алиас базы данных.
+    """
+
+    # Модель -> поля естественного ключа, в порядке зависимостей
+    NATURAL_KEYS = {
+        ContentType: ('app_label', 'model'),
+        Permission: ('content_type_id', 'codename'),
+    }
+
+    def __init__(self, file, media_source, media_target,
+                 batch_size=IMPORT_BATCH_SIZE, workers=MEDIA_COPY_WORKERS,
+                 exclude=(), stdout=None, using=DEFAULT_DB_ALIAS):
+        self.file = file
+        self.media_source = media_source
+        self.media_target = media_target
+        self.batch_size = batch_size
+        self.workers = workers
+        self.exclude = {label.lower() for label in exclude}
+        self.stdout = stdout or sys.stdout
+        self.using = using
+        self.buffers = defaultdict(list)
+        self.loaded = Counter()
+        self.media = {}
+        self.held = {}
+
+    def is_excluded(self, model):
+        opts = model._meta
+        return bool({opts.app_label, opts.label_lower} & self.exclude)
+
+    def is_held(self, model):
+        """Нужно ли отложить запись модели до сопоставления ключей.
+
+        Returns:
+            bool: True для моделей из `NATURAL_KEYS` и моделей,
+            которые на них ссылаются.
+        """
+        if model not in self.held:
+            opts = model._meta
+            self.held[model] = model in self.NATURAL_KEYS or any(
+                field.related_model in self.NATURAL_KEYS
+                for field in (*opts.concrete_fields, *opts.many_to_many)
+            )
+        return self.held[model]
+
+    def match_natural_keys(self, model, objects, mappings):
+        """Сопоставляет объекты дампа с записями в базе.
+
+        Args:
+            model (Model): Модель из `NATURAL_KEYS`.
+            objects (list[DeserializedObject]): Её объекты из дампа.
+            mappings (dict): Уже построенные соответствия для ссылок.
+
+        Returns:
+            dict[int, int]: Соответствие `pk в дампе -> pk в базе`.
+        """
+        fields = self.NATURAL_KEYS[model]
+        manager = model._base_manager.using(self.using)
+        keys = {}
+        for obj in objects:
+            remap_references(obj, mappings)
+            keys[obj.object.pk] = tuple(
+                getattr(obj.object, field) for field in fields
+            )
+
+        found = set(manager.values_list(*fields))
+        missing = [obj.object for obj in objects
+                   if keys[obj.object.pk] not in found]
+        for instance in missing:
+            instance.pk = None
+        manager.bulk_create(missing, batch_size=self.batch_size)
+
+        found = {
+            tuple(row[:-1]): row[-1]
+            for row in manager.values_list(*fields, 'pk')
+        }
+        return {pk: found[key] for pk, key in keys.items()}
+
+    def sorted_models(self):
+        """Загруженные модели в порядке зависимостей по внешним ключам.
+
+        Returns:
+            list[Model]: Модели, на которые ссылаются, идут раньше.
+        """
+        ordered = []
+
+        def visit(model, path):
+            if model in ordered or model in path:
+                return
+            for field in model._meta.concrete_fields:
+                if field.related_model in self.loaded:
+                    visit(field.related_model, path | {model})
+            ordered.append(model)
+
+        for model in self.loaded:
+            visit(model, frozenset())
+        return ordered
+
+    def flush(self, model):
+        """Записывает накопленные объекты модели и их связи many-to-many.
+
+        Args:
+            model (Model): Модель, пачку которой нужно записать.
+        """
+        objects = self.buffers.pop(model, [])
+        if not objects:
+            return
+        opts = model._meta
+        model._base_manager.using(self.using).bulk_create(
+            [obj.object for obj in objects],
+            update_conflicts=True,
+            unique_fields=[opts.pk.name],
+            update_fields=[
+                field.name for field in opts.concrete_fields
+                if not field.primary_key
+            ],
+        )
+        for field in opts.many_to_many:
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                continue
+            through._base_manager.using(self.using).filter(**{
+                f'{field.m2m_field_name()}_id__in': [
+                    obj.object.pk for obj in objects
+                    if field.name in obj.m2m_data
+                ],
+            }).delete()
+            through._base_manager.using(self.using).bulk_create(
+                m2m_rows(field, objects), batch_size=self.batch_size,
+            )
+
+    def add(self, obj, executor):
+        """Добавляет объект в пачку и ставит его медиафайлы в очередь.
+
+        Args:
+            obj (DeserializedObject): Объект из дампа.
+            executor (ThreadPoolExecutor): Пул копирования медиафайлов.
+        """
+        model = type(obj.object)
+        for field in model._meta.concrete_fields:
+            name = str(getattr(obj.object, field.attname) or '')
+            if isinstance(field, FileField) and name and (
+                name not in self.media
+            ):
+                self.media[name] = executor.submit(
+                    copy_media, name, self.media_source, self.media_target
+                )
+
+        self.buffers[model].append(obj)
+        self.loaded[model] += 1
+        if (len(self.buffers[model]) >= self.batch_size
+                and not self.is_held(model)):
+            self.flush(model)
+
+        total = sum(self.loaded.values())
+        if total % IMPORT_PROGRESS_EVERY == 0:
+            self.stdout.write(f'Обработано объектов: {total}\n')
+
+    def resolve_natural_keys(self):
+        """Сопоставляет записи `NATURAL_KEYS` с базой и правит ссылки.
+
+        Записи из `NATURAL_KEYS` не пишутся: используются уже
+        существующие, недостающие создаются.
+        """
+        mappings = {}
+        for model in self.NATURAL_KEYS:
+            objects = self.buffers.pop(model, [])
+            if objects:
+                mappings[model] = self.match_natural_keys(
+                    model, objects, mappings
+                )
+        if mappings:
+            for objects in self.buffers.values():
+                for obj in objects:
+                    remap_references(obj, mappings)
+
+    def reset_sequences(self, connection):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), list(self.loaded)
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def read_file(self):
+        """Загружает дамп в одной транзакции.
+
+        Raises:
+            DeserializationError: Объект дампа не подходит к моделям.
+            IntegrityError: Внешний ключ ссылается на отсутствующую запись.
+            ValueError: Файл не является JSON-массивом.
+        """
+        connection = connections[self.using]
+        objects = Deserializer(
+            iter_json_array(self.file), using=self.using,
+            ignorenonexistent=True,
+        )
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            with transaction.atomic(using=self.using):
+                with connection.constraint_checks_disabled():
+                    for obj in objects:
+                        if not self.is_excluded(type(obj.object)):
+                            self.add(obj, executor)
+                    self.resolve_natural_keys()
+                    for model in self.sorted_models():
+                        self.flush(model)
+                self.reset_sequences(connection)
+                connection.check_constraints(table_names=[
+                    model._meta.db_table for model in self.loaded
+                ])
+        self.report()
+
+    def report(self):
+        for model in self.sorted_models():
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {self.loaded[model]}\n'
+            )
+        results = Counter()
+        for name, future in self.media.items():
+            status = future.result()
+            results[status] += 1
+            if status in (MEDIA_MISSING, MEDIA_CORRUPTED):
+                self.stdout.write(f'Медиафайл {name}: {status}\n')
+        self.stdout.write('Медиафайлы: ' + ', '.join(
+            f'{status} - {count}' for status, count in results.items()
+        ) + '\n')
@@ -1,10 +1,17 @@
 import csv
+import gzip
 import json
 import os
+import re
+import sys
 from string import hexdigits
 
+from django.db import transaction
 from rest_framework.serializers import ValidationError
 
+from recipes.manager.conf import (IMPORT_BATCH_SIZE, IMPORT_ERRORS_SHOWN,
+                                  IMPORT_PROGRESS_EVERY, JSON_CHUNK_SIZE,
+                                  MAX_LEN_RECIPES_CHARFIELD)
 from recipes.models import Ingredient, Tag
 
 TAGS_MANAGER = 'tags'
@@ -15,9 +22,24 @@ JSON_READER = '.json'
 
 CSV_READER = '.csv'
 
+NDJSON_READERS = ('.ndjson', '.jsonl')
 
-def default():
-    print('Файл должен быть json|csv формата!')
+GZIP_SUFFIX = '.gz'
+
+# Расширение файла -> функция чтения строк (см. `register_reader`)
+READERS = {}
+
+# Модель, поля и ключ для поиска повторов для каждого справочника
+MANAGERS = {
+    TAGS_MANAGER: (Tag, ('name', 'color', 'slug'), ('slug',)),
+    PRODUCT_MANAGER: (
+        Ingredient,
+        ('name', 'measurement_unit'),
+        ('name', 'measurement_unit'),
+    ),
+}
+
+JSON_SEPARATORS = re.compile(r'[\s,]*')
 
 
 def hex_color_validate(value):
@@ -57,88 +79,237 @@ def check_color(color):
     return f'#{color}'
 
 
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """Читает JSON-массив объектов по одному, не загружая файл целиком.
+
+    Args:
+        file (file): Открытый текстовый файл с JSON-массивом.
+        chunk_size (int): Сколько символов читать за раз.
+
+    Raises:
+        ValueError: Файл не является JSON-массивом или оборван.
+
+    Yields:
+        dict: Очередной объект массива.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer:
+        return
+    if not buffer.startswith('['):
+        raise ValueError('Файл должен содержать JSON-массив')
+    pos, eof = 1, False
+
+    while True:
+        pos = JSON_SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            if buffer[pos] == ']':
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                continue
+        elif eof:
+            raise ValueError('Неожиданный конец JSON-массива')
+
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def register_reader(*extensions):
+    """Регистрирует функцию чтения строк для расширений файла.
+
+    Функция принимает открытый текстовый файл и кортеж полей
+    справочника и возвращает итератор словарей. Сжатые варианты
+    (`*.csv.gz` и т.п.) поддерживаются автоматически.
+
+    Args:
+        extensions (str): Расширения файла, например `.csv`.
+    """
+    def decorator(func):
+        for extension in extensions:
+            READERS[extension] = func
+        return func
+    return decorator
+
+
+@register_reader(CSV_READER)
+def csv_rows(file, fields):
+    """CSV без заголовка: значения идут в порядке полей справочника."""
+    for row in csv.reader(file):
+        yield dict(zip(fields, row))
+
+
+@register_reader(JSON_READER)
+def json_rows(file, fields):
+    """JSON-массив объектов, читается потоком."""
+    return iter_json_array(file)
+
+
+@register_reader(*NDJSON_READERS)
+def ndjson_rows(file, fields):
+    """Один JSON-объект на строку, пустые строки пропускаются."""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def file_format(filename):
+    """Возвращает расширение, по которому выбирается функция чтения.
+
+    Args:
+        filename (str): Имя файла, например `ingredients.csv.gz`.
+
+    Returns:
+        str: Расширение без учёта сжатия, например `.csv`.
+    """
+    name, extension = os.path.splitext(filename)
+    if extension == GZIP_SUFFIX:
+        extension = os.path.splitext(name)[1]
+    return extension.lower()
+
+
+def open_file(path):
+    """Открывает файл справочника как текстовый поток.
+
+    Файлы `*.gz` распаковываются на лету, без временных файлов.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        file: Открытый текстовый файл в кодировке UTF-8.
+    """
+    if path.endswith(GZIP_SUFFIX):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
 class FileReader:
+    """Импорт тегов и ингредиентов из файла.
+
+    Файл читается построчно (потоком), повторы отбрасываются в памяти,
+    записи добавляются пачками `bulk_create(ignore_conflicts=True)`
+    в одной транзакции. Уже существующие в базе записи пропускаются.
+    Вместо сообщения на каждую строку выводится прогресс и итог.
 
-    def __init__(self, file, manager):
+    Attributes:
+        file(file):
+            Открытый файл.
+        manager(str):
+            Справочник - `TAGS_MANAGER` или `PRODUCT_MANAGER`.
+        batch_size(int):
+            Количество записей в одном INSERT.
+        stdout(file):
+            Куда выводить прогресс и итог.
+    """
+
+    def __init__(self, file, manager, batch_size=IMPORT_BATCH_SIZE,
+                 stdout=None):
         self.file = file
-        self.reader = os.path.splitext(self.file.name)[1]
+        self.reader = file_format(self.file.name)
         self.manager = manager
+        self.batch_size = batch_size
+        self.stdout = stdout or sys.stdout
 
-    def tags_csv(self):
-        datareader = csv.reader(self.file)
-        for row in datareader:
-            try:
-                Tag.objects.get_or_create(
-                    name=row[0],
-                    color=row[1],
-                    slug=row[2]
-                )
-                print(f'{row[0]} записан в базу')
-            except Exception as error:
-                print(f'Ошибка при добавлении {row[0]} в базу.\n'
-                      f'Ошибка: {error}')
-        self.file.close()
-
-    def tags_json(self):
-        data = json.load(self.file)
-        for row in data:
-            try:
-                Tag.objects.get_or_create(
-                    name=row["name"],
-                    color=row["color"],
-                    slug=row["slug"]
-                )
-                print(f'{row["name"]} записан в базу')
-            except Exception as error:
-                name = row["name"]
-                print(f'Ошибка при добавлении {name} в базу.\n'
-                      f'Ошибка: {error}')
-        self.file.close()
-
-    def product_csv(self):
-        datareader = csv.reader(self.file)
-        for row in datareader:
-            try:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
-                print(f'{row[0]} записан в базу')
-            except Exception as error:
-                print(f'Ошибка при добавлении {row[0]} в базу.\n'
-                      f'Ошибка: {error}')
-        self.file.close()
-
-    def product_json(self):
-        data = json.load(self.file)
-        for row in data:
+    def clean_row(self, row):
+        """Проверяет и нормализует строку файла.
+
+        Args:
+            row (dict): Значения полей из файла.
+
+        Raises:
+            ValueError: Поле отсутствует, пустое, слишком длинное
+                или содержит некорректный цвет.
+
+        Returns:
+            dict: Значения полей для модели.
+        """
+        _, fields, _ = MANAGERS[self.manager]
+        values = {}
+
+        for field in fields:
+            if row.get(field) is None:
+                raise ValueError(f'нет поля {field}')
+            values[field] = str(row[field]).strip()
+            if not values[field]:
+                raise ValueError(f'пустое поле {field}')
+            if len(values[field]) > MAX_LEN_RECIPES_CHARFIELD:
+                raise ValueError(f'поле {field} слишком длинное')
+
+        if 'color' in values:
             try:
-                Ingredient.objects.get_or_create(
-                    name=row["name"],
-                    measurement_unit=row["measurement_unit"],
-                )
-                print(f'{row["name"]} записан в базу')
-            except Exception as error:
-                name = row["name"]
-                print(f'Ошибка при добавлении {name} в базу.\n'
-                      f'Ошибка: {error}')
-        self.file.close()
+                values['color'] = check_color(values['color'])
+            except ValidationError:
+                raise ValueError(f'некорректный цвет {values["color"]}')
+        return values
+
+    def import_rows(self, rows):
+        """Записывает строки в базу пачками.
+
+        Args:
+            rows (Iterable[dict]): Строки файла.
+        """
+        model, _, key_fields = MANAGERS[self.manager]
+        seen = set()
+        batch = []
+        total = invalid = duplicates = 0
+
+        with transaction.atomic():
+            before = model.objects.count()
+
+            for total, row in enumerate(rows, 1):
+                try:
+                    values = self.clean_row(row)
+                except (AttributeError, ValueError) as error:
+                    invalid += 1
+                    if invalid <= IMPORT_ERRORS_SHOWN:
+                        self.stdout.write(
+                            f'Строка {total} пропущена: {error}\n'
+                        )
+                    continue
+
+                key = tuple(values[field] for field in key_fields)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+
+                batch.append(model(**values))
+                if len(batch) >= self.batch_size:
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+                if total % IMPORT_PROGRESS_EVERY == 0:
+                    self.stdout.write(f'Обработано строк: {total}\n')
+
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created = model.objects.count() - before
+
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: прочитано строк - {total}, '
+            f'добавлено - {created}, '
+            f'уже были в базе - {total - invalid - duplicates - created}, '
+            f'повторов в файле - {duplicates}, ошибок - {invalid}\n'
+        )
 
     def read_file(self):
-        if self.reader not in (CSV_READER, PRODUCT_MANAGER):
-            default()
-            return
-        if self.reader == CSV_READER:
-            if self.manager == TAGS_MANAGER:
-                self.tags_csv()
-                return
-            if self.manager == PRODUCT_MANAGER:
-                self.product_csv()
-                return
-        if self.reader == JSON_READER:
-            if self.manager == TAGS_MANAGER:
-                self.tags_json()
-                return
-            if self.manager == PRODUCT_MANAGER:
-                self.product_json()
-                return
+        """Импортирует файл функцией чтения, выбранной по расширению.
+
+        Raises:
+            ValueError: Формат файла не поддерживается.
+        """
+        reader = READERS.get(self.reader)
+        if reader is None:
+            raise ValueError(
+                'файл должен быть формата '
+                f'{"|".join(ext.strip(".") for ext in READERS)}, '
+                f'в том числе сжатый ({GZIP_SUFFIX})'
+            )
+        _, fields, _ = MANAGERS[self.manager]
+        self.import_rows(reader(self.file, fields))
@@ -23,3 +23,66 @@ MIN_AMOUNT_INGREDIENT = 1
 
 # Максимальное время приготовления
 MAX_AMOUNT_INGREDIENT = 10000
+
+"""
+Импорт справочников
+"""
+
+# Количество записей в одном INSERT при импорте
+IMPORT_BATCH_SIZE = 1000
+
+# Как часто (в строках) выводить прогресс импорта
+IMPORT_PROGRESS_EVERY = 10_000
+
+# Сколько ошибок в строках файла выводить при импорте
+IMPORT_ERRORS_SHOWN = 10
+
+# Размер порции при чтении JSON-файла (символы)
+JSON_CHUNK_SIZE = 64 * 1024
+
+"""
+Загрузка полного дампа
+"""
+
+# Количество потоков для копирования медиафайлов из дампа
+MEDIA_COPY_WORKERS = 4
+
+"""
+Изображения рецептов
+"""
+
+# Максимальный размер основного изображения (ширина, высота)
+IMAGE_MAX_SIZE = (1600, 1600)
+
+# Размер изображения для карточки рецепта (обрезается под пропорции)
+IMAGE_CARD_SIZE = (760, 480)
+
+# Размер миниатюры (обрезается под пропорции)
+IMAGE_THUMB_SIZE = (160, 160)
+
+# Форматы в порядке предпочтения - берётся первый, который умеет Pillow.
+# AVIF (Pillow 11.3+) сжимает лучше, но кодируется в разы дольше WebP
+IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+# Качество сжатия изображений
+IMAGE_QUALITY = 80
+
+# Состояния обработки изображения рецепта
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+
+IMAGE_STATUSES = (
+    (IMAGE_PENDING, 'В обработке'),
+    (IMAGE_READY, 'Готово'),
+    (IMAGE_FAILED, 'Ошибка обработки'),
+)
+
+# Сколько раз пытаться обработать изображение
+IMAGE_TASK_MAX_ATTEMPTS = 3
+
+# Через сколько секунд взятая, но не завершённая задача считается брошенной
+IMAGE_TASK_TIMEOUT = 5 * 60
+
+# Пауза обработчика очереди, когда задач нет (секунды)
+IMAGE_WORKER_SLEEP = 2
@@ -0,0 +1,248 @@
+"""Обработка изображений рецептов.
+
+Загруженное изображение декодируется один раз, уменьшается до
+`IMAGE_MAX_SIZE` и пересжимается в первый доступный формат из
+`IMAGE_FORMATS`. Из него же получаются карточка и миниатюра.
+
+Обработка выполняется вне запроса: сериализатор ставит рецепт
+в очередь (`enqueue_recipe_image`), обработчик `image_worker`
+забирает задачи (`claim_task`) и выполняет их (`run_task`).
+"""
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.manager.conf import (IMAGE_CARD_SIZE, IMAGE_FAILED, IMAGE_FORMATS,
+                                  IMAGE_MAX_SIZE, IMAGE_PENDING, IMAGE_QUALITY,
+                                  IMAGE_READY, IMAGE_TASK_MAX_ATTEMPTS,
+                                  IMAGE_TASK_TIMEOUT, IMAGE_THUMB_SIZE)
+from recipes.models import ImageTask, Recipe
+
+IMAGE_EXTENSIONS = {'AVIF': '.avif', 'WEBP': '.webp', 'JPEG': '.jpg'}
+
+# Поле модели -> размер варианта и нужно ли обрезать под пропорции
+IMAGE_VARIANTS = {
+    'image': (IMAGE_MAX_SIZE, False),
+    'image_card': (IMAGE_CARD_SIZE, True),
+    'image_thumb': (IMAGE_THUMB_SIZE, True),
+}
+
+
+def image_format():
+    """Первый формат из `IMAGE_FORMATS`, который Pillow умеет сохранять.
+
+    Raises:
+        ImproperlyConfigured: Ни один формат не поддерживается.
+    """
+    Image.init()
+    for name in IMAGE_FORMATS:
+        if name in Image.SAVE:
+            return name
+    raise ImproperlyConfigured(
+        f'Pillow не умеет сохранять ни один из {IMAGE_FORMATS}'
+    )
+
+
+def encode(image, file_format):
+    """Сохраняет изображение в памяти в нужном формате.
+
+    Args:
+        image (Image): Изображение Pillow.
+        file_format (str): Формат Pillow, например `WEBP`.
+
+    Returns:
+        ContentFile: Содержимое файла.
+    """
+    transparent = (
+        image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    )
+    mode = 'RGBA' if transparent and file_format != 'JPEG' else 'RGB'
+    if image.mode != mode:
+        image = image.convert(mode)
+    buffer = BytesIO()
+    image.save(buffer, file_format, quality=IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(file):
+    """Декодирует изображение и готовит все его варианты.
+
+    JPEG декодируется сразу в уменьшенном масштабе (`draft`),
+    поворот берётся из EXIF.
+
+    Args:
+        file (File): Исходный файл изображения.
+
+    Returns:
+        tuple[str, dict]: Формат и содержимое файлов по полям модели.
+    """
+    file_format = image_format()
+    file.open('rb')
+    with Image.open(file) as source:
+        source.draft('RGB', IMAGE_MAX_SIZE)
+        image = ImageOps.exif_transpose(source)
+    image.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+
+    variants = {}
+    for field, (size, crop) in IMAGE_VARIANTS.items():
+        variant = (
+            ImageOps.fit(image, size, Image.Resampling.LANCZOS) if crop
+            else image
+        )
+        variants[field] = encode(variant, file_format)
+    return file_format, variants
+
+
+def delete_unused(names, storage):
+    """Удаляет файлы, на которые больше не ссылается ни один рецепт."""
+    for name in names:
+        if name and not Recipe.objects.filter(
+            Q(image=name) | Q(image_card=name) | Q(image_thumb=name)
+        ).exists():
+            storage.delete(name)
+
+
+def swap_variants(recipe_id, source, names):
+    """Атомарно подставляет готовые варианты изображения.
+
+    Поля рецепта меняются одним UPDATE и только если изображение
+    с момента постановки в очередь не заменили.
+
+    Args:
+        recipe_id (int): Рецепт.
+        source (str): Имя исходного изображения.
+        names (dict): Имена новых файлов по полям модели.
+
+    Returns:
+        bool: False, если рецепт удалён или изображение заменено.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    with transaction.atomic():
+        old = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=source
+        ).values(*IMAGE_VARIANTS).first()
+        if old is not None:
+            Recipe.objects.filter(pk=recipe_id).update(
+                image_status=IMAGE_READY, **names
+            )
+    if old is None:
+        delete_unused(names.values(), storage)
+        return False
+    delete_unused(set(old.values()) - set(names.values()), storage)
+    return True
+
+
+def process_recipe_image(recipe_id, source):
+    """Создаёт варианты изображения и подставляет их в рецепт.
+
+    Файлы пишутся до транзакции, в ней только меняются имена в полях,
+    поэтому клиенты видят либо старые, либо все новые варианты.
+
+    Args:
+        recipe_id (int): Рецепт.
+        source (str): Имя исходного изображения.
+
+    Returns:
+        bool: False, если результат отброшен (см. `swap_variants`).
+    """
+    field = Recipe._meta.get_field('image')
+    with field.storage.open(source, 'rb') as file:
+        file_format, variants = render_variants(file)
+    filename = f'{Path(source).stem}{IMAGE_EXTENSIONS[file_format]}'
+
+    names = {}
+    for name, content in variants.items():
+        variant_field = Recipe._meta.get_field(name)
+        names[name] = field.storage.save(
+            variant_field.generate_filename(None, filename), content
+        )
+    return swap_variants(recipe_id, source, names)
+
+
+def enqueue_recipe_image(recipe):
+    """Записывает новое изображение рецепта и ставит его в очередь.
+
+    Обычный `save()` не записывает поля изображения
+    (`Recipe.MANAGED_FIELDS`), чтобы устаревший объект не затёр
+    результат обработки. Поэтому новый файл сохраняется в хранилище
+    и записывается в рецепт здесь. Ещё не взятые задачи для прежнего
+    изображения снимаются.
+
+    Args:
+        recipe (Recipe): Сохранённый рецепт с новым изображением.
+    """
+    image = Recipe._meta.get_field('image').pre_save(recipe, add=False)
+    ImageTask.objects.filter(recipe=recipe, started__isnull=True).delete()
+    recipe.image_status = IMAGE_PENDING
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image=image.name, image_status=IMAGE_PENDING
+    )
+    ImageTask.objects.create(recipe=recipe, source=image.name)
+
+
+def claim_task():
+    """Забирает из очереди первую свободную задачу.
+
+    Свободна задача, которую ещё не брали или взяли больше
+    `IMAGE_TASK_TIMEOUT` секунд назад (обработчик упал). На PostgreSQL
+    строки, взятые другими обработчиками, пропускаются (SKIP LOCKED).
+
+    Returns:
+        ImageTask | None: Взятая задача или None, если очередь пуста.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=IMAGE_TASK_TIMEOUT)
+    with transaction.atomic():
+        task = ImageTask.objects.select_for_update(skip_locked=True).filter(
+            Q(started__isnull=True) | Q(started__lt=stale)
+        ).first()
+        if task is not None:
+            ImageTask.objects.filter(pk=task.pk).update(
+                started=now, attempts=F('attempts') + 1
+            )
+            task.attempts += 1
+    return task
+
+
+def fail_task(task):
+    """Отмечает неудачную попытку обработки.
+
+    Задача остаётся взятой и вернётся в очередь через
+    `IMAGE_TASK_TIMEOUT` секунд. Когда попытки исчерпаны, задача
+    снимается, а изображение рецепта отмечается как необработанное.
+
+    Args:
+        task (ImageTask): Задача, полученная из `claim_task`.
+
+    Returns:
+        bool: True, если попытки исчерпаны.
+    """
+    if task.attempts < IMAGE_TASK_MAX_ATTEMPTS:
+        return False
+    with transaction.atomic():
+        Recipe.objects.filter(pk=task.recipe_id, image=task.source).update(
+            image_status=IMAGE_FAILED
+        )
+        task.delete()
+    return True
+
+
+def run_task(task):
+    """Обрабатывает изображение из задачи и снимает её из очереди.
+
+    Args:
+        task (ImageTask): Задача, полученная из `claim_task`.
+
+    Returns:
+        bool: False, если результат отброшен (см. `swap_variants`).
+    """
+    done = process_recipe_image(task.recipe_id, task.source)
+    task.delete()
+    return done
@@ -12,21 +12,26 @@ Models:
     AmountIngredient:
         Модель для связи Ingredient и Recipe.
         Также указывает количество ингридиента.
+    ImageTask:
+        Очередь обработки изображений рецептов.
 """
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db.models import (CASCADE, CharField, CheckConstraint,
-                              DateTimeField, ForeignKey, ImageField,
-                              ManyToManyField, Model,
-                              PositiveSmallIntegerField, Q, TextField,
-                              UniqueConstraint)
+                              DateTimeField, Exists, ForeignKey, ImageField,
+                              ManyToManyField, Model, OuterRef,
+                              PositiveIntegerField, PositiveSmallIntegerField,
+                              Prefetch, Q, QuerySet, TextField,
+                              UniqueConstraint, Value)
 from django.db.models.functions import Length
 
-from recipes.manager.conf import (MAX_AMOUNT_INGREDIENT,
+from recipes.manager.conf import (IMAGE_READY, IMAGE_STATUSES,
+                                  MAX_AMOUNT_INGREDIENT,
                                   MAX_LEN_RECIPES_CHARFIELD,
                                   MAX_LEN_RECIPES_TEXTFIELD, MAX_VALUE_COOKING,
                                   MIN_AMOUNT_INGREDIENT, MIN_VALUE_COOKING)
-from users.models import User
+from users.models import CountersMixin, Subscribe, User
 
 CharField.register_lookup(Length)
 
@@ -111,6 +116,13 @@ class Ingredient(Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ('name',)
+        indexes = (
+            GinIndex(
+                fields=('name',),
+                name='ingredient_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+        )
         constraints = (
             UniqueConstraint(
                 fields=('name', 'measurement_unit'),
@@ -130,7 +142,73 @@ class Ingredient(Model):
         return f'{self.name} {self.measurement_unit}'
 
 
-class Recipe(Model):
+class RecipeQuerySet(QuerySet):
+    """Набор запросов для чтения рецептов.
+
+    Собирает в фиксированное число запросов всё, что нужно
+    для вывода рецепта: автора, теги, ингредиенты и флаги
+    запрашивающего пользователя.
+    """
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги запрашивающего пользователя.
+
+        Флаги вычисляются подзапросами `EXISTS` в том же запросе,
+        что и выборка рецептов.
+
+        Args:
+            user (User): Запрашивающий пользователь (может быть анонимным).
+
+        Returns:
+            RecipeQuerySet: Рецепты с полями `is_favorited`,
+            `is_in_shopping_cart` и `author_is_subscribed`.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user_id=user.id,
+                                        recipe_id=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                OrderCart.objects.filter(user_id=user.id,
+                                         recipe_id=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Subscribe.objects.filter(user_id=user.id,
+                                         author_id=OuterRef('author_id'))
+            ),
+        )
+
+    def for_read(self, user):
+        """Готовит рецепты для вывода списком или по одному.
+
+        Страница любого размера выбирается за три запроса:
+        рецепты с автором и флагами, теги, ингредиенты.
+
+        Args:
+            user (User): Запрашивающий пользователь (может быть анонимным).
+
+        Returns:
+            RecipeQuerySet: Рецепты с подгруженными связями.
+        """
+        return self.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'amount_ingredients',
+                queryset=AmountIngredient.objects.select_related(
+                    'ingredients'
+                ),
+            ),
+        ).with_user_flags(user)
+
+
+class Recipe(CountersMixin, Model):
     """Модель для рецептов.
 
     Основная модель приложения описывающая рецепты.
@@ -149,12 +227,29 @@ class Recipe(Model):
             Дата добавления рецепта. Прописывается автоматически.
         image(str):
             Изображение рецепта. Указывает путь к изображению.
+        image_card(str):
+            Изображение для карточки рецепта. Создаётся при обработке.
+        image_thumb(str):
+            Миниатюра изображения. Создаётся при обработке.
+        image_status(str):
+            Состояние обработки изображения: pending, ready или failed.
         text(str):
             Описание рецепта. Установлены ограничения по длине.
         cooking_time(int):
             Время приготовления рецепта.
             Установлены ограничения по максимальным и минимальным значениям.
+        favorites_count(int):
+            Сколько раз рецепт добавлен в избранное. Счётчик.
+        shopping_carts_count(int):
+            Сколько раз рецепт добавлен в список покупок. Счётчик.
     """
+    COUNTER_FIELDS = ('favorites_count', 'shopping_carts_count')
+    # Изображение и его варианты пишут только `enqueue_recipe_image`
+    # и обработчик (`recipes.manager.images`)
+    MANAGED_FIELDS = ('image', 'image_card', 'image_thumb', 'image_status')
+
+    objects = RecipeQuerySet.as_manager()
+
     name = CharField(
         verbose_name='Название блюда',
         max_length=MAX_LEN_RECIPES_CHARFIELD,
@@ -184,6 +279,25 @@ class Recipe(Model):
         verbose_name='Изображение блюда',
         upload_to='recipe_images/',
     )
+    image_card = ImageField(
+        verbose_name='Изображение для карточки',
+        upload_to='recipe_images/card/',
+        blank=True,
+        editable=False,
+    )
+    image_thumb = ImageField(
+        verbose_name='Миниатюра',
+        upload_to='recipe_images/thumb/',
+        blank=True,
+        editable=False,
+    )
+    image_status = CharField(
+        verbose_name='Обработка изображения',
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        editable=False,
+    )
     text = TextField(
         verbose_name='Описание блюда',
         max_length=MAX_LEN_RECIPES_TEXTFIELD,
@@ -202,11 +316,33 @@ class Recipe(Model):
             ),
         ),
     )
+    favorites_count = PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_carts_count = PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+            GinIndex(
+                fields=('text',),
+                name='recipe_text_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+        )
         constraints = (
             UniqueConstraint(
                 fields=('name', 'author'),
@@ -348,3 +484,55 @@ class OrderCart(Model):
 
     def __str__(self) -> str:
         return f'{self.user} {self.recipe}'
+
+
+class ImageTask(Model):
+    """Задача обработки изображения рецепта.
+
+    Очередь хранится в базе: обработчик (`image_worker`) забирает
+    задачи по одной, `started` отмечает взятую задачу.
+
+    Attributes:
+        recipe(int):
+            Рецепт, изображение которого нужно обработать.
+        source(str):
+            Имя файла изображения на момент постановки в очередь.
+            Если изображение с тех пор заменили, результат отбрасывается.
+        created(datetime):
+            Время постановки в очередь.
+        started(datetime):
+            Когда задачу взял обработчик. Пусто - задача ждёт.
+        attempts(int):
+            Количество попыток обработки.
+    """
+    recipe = ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='image_tasks',
+        on_delete=CASCADE,
+    )
+    source = CharField(
+        verbose_name='Исходное изображение',
+        max_length=255,
+    )
+    created = DateTimeField(
+        verbose_name='Поставлена в очередь',
+        auto_now_add=True,
+    )
+    started = DateTimeField(
+        verbose_name='Взята в работу',
+        null=True,
+        blank=True,
+    )
+    attempts = PositiveSmallIntegerField(
+        verbose_name='Попыток',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Очередь обработки изображений'
+        ordering = ('id',)
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id}: {self.source}'
@@ -0,0 +1,61 @@
+"""Поддержка счётчиков `User` и `Recipe` в актуальном состоянии.
+
+Счётчики меняются запросом `UPDATE ... SET x = x + 1` сразу после
+создания или удаления связанной записи. Пересчитать их целиком можно
+командой `python manage.py rebuild_counters`.
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Favorite, OrderCart, Recipe
+from users.models import Subscribe, User
+
+# Модель связи -> (модель со счётчиком, поле связи, поле счётчика)
+COUNTERS = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscribe: (User, 'author_id', 'subscribers_count'),
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    OrderCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+}
+
+
+def change_counters(sender, related_ids, delta):
+    """Меняет счётчики сразу для нескольких записей одним UPDATE.
+
+    Используется массовыми операциями, которые не отправляют сигналы.
+
+    Args:
+        sender (Model): Модель связи, например `Favorite`.
+        related_ids (Iterable[int]): id записей со счётчиком.
+        delta (int): На сколько изменить каждый счётчик.
+    """
+    model, _, counter = COUNTERS[sender]
+    model.objects.filter(pk__in=related_ids).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
+
+
+def change_counter(instance, delta):
+    model, relation, counter = COUNTERS[type(instance)]
+    model.objects.filter(pk=getattr(instance, relation)).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=OrderCart)
+def increase_counter(instance, created, **kwargs):
+    if created:
+        change_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=OrderCart)
+def decrease_counter(instance, **kwargs):
+    change_counter(instance, -1)
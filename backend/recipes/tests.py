@@ -0,0 +1,161 @@
+"""Тесты приложения `recipes`.
+
+Запуск: `python manage.py test recipes`.
+"""
+import base64
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from api.manager.conf import TAG_MAP_CACHE_KEY
+from api.manager.order_cart import get_cached_cart
+from api.manager.tag_map import tag_slug_map
+from api.serializers import RecipeSerializer
+from recipes.management.reader.dump_reader import DumpReader
+from recipes.manager.conf import IMAGE_PENDING, IMAGE_READY
+from recipes.manager.images import claim_task, enqueue_recipe_image, run_task
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+
+class DumpReaderTest(TransactionTestCase):
+    """Загрузка дампа в базу, где `migrate` уже создал типы и права."""
+
+    def test_content_types_matched_by_natural_key(self):
+        user = User.objects.create_user(
+            email='admin@foodgram.ru', username='admin',
+            first_name='Admin', last_name='Admin', password='pass',
+        )
+        recipe_type = ContentType.objects.get_for_model(Recipe)
+        dump_type_pk = ContentType.objects.order_by('-pk')[0].pk + 1
+        dump = [
+            {'model': 'admin.logentry', 'pk': 1, 'fields': {
+                'action_time': '2023-11-16T00:00:00Z', 'user': user.pk,
+                'content_type': dump_type_pk, 'object_id': '1',
+                'object_repr': 'Завтрак', 'action_flag': 1,
+                'change_message': '',
+            }},
+            {'model': 'auth.permission', 'pk': 1, 'fields': {
+                'name': 'Can add recipe', 'content_type': dump_type_pk,
+                'codename': 'add_recipe',
+            }},
+            {'model': 'contenttypes.contenttype', 'pk': dump_type_pk,
+             'fields': {'app_label': 'recipes', 'model': 'recipe'}},
+            {'model': 'contenttypes.contenttype', 'pk': recipe_type.pk,
+             'fields': {'app_label': 'recipes', 'model': 'removed'}},
+            {'model': 'recipes.tag', 'pk': 1, 'fields': {
+                'name': 'Завтрак', 'color': '#FFFFFF', 'slug': 'breakfast',
+            }},
+        ]
+        types_count = ContentType.objects.count()
+        permissions_count = Permission.objects.count()
+
+        DumpReader(StringIO(json.dumps(dump)), media_source='',
+                   media_target='', stdout=StringIO()).read_file()
+
+        self.assertEqual(LogEntry.objects.get().content_type, recipe_type)
+        self.assertEqual(ContentType.objects.count(), types_count + 1)
+        self.assertTrue(ContentType.objects.filter(
+            app_label='recipes', model='removed'
+        ).exists())
+        self.assertEqual(Permission.objects.count(), permissions_count)
+        self.assertEqual(Tag.objects.get().slug, 'breakfast')
+
+    def test_load_dump_clears_shared_cache(self):
+        version, _ = get_cached_cart(1)
+        tag_slug_map()
+        with tempfile.TemporaryDirectory() as data:
+            with open(f'{data}/dump.json', 'w') as file:
+                json.dump([{'model': 'recipes.tag', 'pk': 1, 'fields': {
+                    'name': 'Обед', 'color': '#FFFFFF', 'slug': 'lunch',
+                }}], file)
+            call_command('load_dump', f'{data}/dump.json', media=data,
+                         stdout=StringIO())
+        self.assertNotEqual(get_cached_cart(1)[0], version)
+        self.assertIsNone(cache.get(TAG_MAP_CACHE_KEY))
+
+
+class RecipeImageTest(TestCase):
+    """Обработка изображения рецепта и обычное сохранение рецепта."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @staticmethod
+    def png(color):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name='recipe.png')
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email='baker@foodgram.ru', username='baker',
+            first_name='Baker', last_name='Baker', password='pass',
+        )
+        self.tag = Tag.objects.create(name='Выпечка', color='#FFFFFF',
+                                      slug='bakery')
+        self.ingredient = Ingredient.objects.create(name='Мука',
+                                                    measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Хлеб', text='Описание', cooking_time=60,
+            image=self.png('red'),
+        )
+        AmountIngredient.objects.create(recipe=self.recipe,
+                                        ingredients=self.ingredient, amount=1)
+        self.recipe.tags.add(self.tag)
+        enqueue_recipe_image(self.recipe)
+
+    def update(self, recipe, **data):
+        serializer = RecipeSerializer(recipe, data={
+            'name': recipe.name, 'text': 'Новое описание',
+            'cooking_time': 30, 'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 2}],
+            **data,
+        }, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_stale_save_keeps_processed_image(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertTrue(run_task(claim_task()))
+
+        self.update(stale)
+
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.image_status, IMAGE_READY)
+        self.assertTrue(recipe.image_card)
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+        self.assertEqual(recipe.text, 'Новое описание')
+
+    def test_new_image_is_saved_and_queued(self):
+        self.assertTrue(run_task(claim_task()))
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+
+        image = base64.b64encode(self.png('blue').read()).decode()
+        self.update(recipe, image=f'data:image/png;base64,{image}')
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, IMAGE_PENDING)
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+        self.assertEqual(claim_task().source, recipe.image.name)
@@ -6,8 +6,8 @@ AbstractUser из Django для переопределения полей обя
 """
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (CASCADE, CharField, CheckConstraint, EmailField,
-                              F, ForeignKey, ManyToManyField, Model, Q,
-                              UniqueConstraint)
+                              F, ForeignKey, ManyToManyField, Model,
+                              PositiveIntegerField, Q, UniqueConstraint)
 from django.db.models.functions import Length
 
 from users.manager.conf import (EMAIL_HELP, FIRST_NAME_HELP, LAST_NAME_HELP,
@@ -18,7 +18,35 @@ from users.validators import MinLenValidator, OneOfTwoValidator
 CharField.register_lookup(Length)
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Защищает поля-счётчики от перезаписи при сохранении модели.
+
+    Счётчики меняются только запросами `UPDATE ... SET x = x + 1`
+    (см. `recipes.signals`). Обычный `save()` существующего объекта
+    не записывает их, чтобы не затереть чужое изменение устаревшим
+    значением из памяти. Так же защищаются и другие поля, которые
+    пишут только отдельные запросы `UPDATE` (`MANAGED_FIELDS`).
+
+    Attributes:
+        COUNTER_FIELDS(tuple): Названия полей-счётчиков.
+        MANAGED_FIELDS(tuple): Названия других полей, которые
+            не записываются обычным `save()`.
+    """
+    COUNTER_FIELDS = ()
+    MANAGED_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (self.pk is not None and not self._state.adding
+                and kwargs.get('update_fields') is None):
+            skipped = self.COUNTER_FIELDS + self.MANAGED_FIELDS
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Настроенная под приложение `Foodgram` модель пользователя.
 
     При создании пользователя все поля обязательны для заполнения.
@@ -46,7 +74,13 @@ class User(AbstractUser):
             Установлено ограничение по максимальной длине.
         subscribe(int):
             Ссылки на id связанных пользователей.
+        recipes_count(int):
+            Количество рецептов пользователя. Счётчик.
+        subscribers_count(int):
+            Количество подписчиков пользователя. Счётчик.
     """
+    COUNTER_FIELDS = ('recipes_count', 'subscribers_count')
+
     email = EmailField(
         verbose_name='Адрес электронной почты',
         max_length=MAX_LEN_EMAIL_FIELD,
@@ -79,6 +113,16 @@ class User(AbstractUser):
         to='Subscribe',
         symmetrical=False,
     )
+    recipes_count = PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [